@@ -0,0 +1,315 @@
+"""Precomputed aggregates of the activities at the (Type, Year, Month) grain.
+
+The cube holds, for every activity type, year and month with activities, the sums of the metric
+columns, the number of activities and the number of average speeds available. Those are additive, so
+every view of the dashboard (per year, per month, per activity, ...) is obtained by slicing the cube
+and summing it again, instead of scanning all the activities.
+
+None of the pages needs the activities themselves, so the cube is built without keeping them: from the
+memory-mapped columnar cache when the ingestion step wrote one for the current version of the csv (see
+data_loader), otherwise by streaming the csv in chunks, each one folded into the cube and then dropped.
+The memory used is then bounded by the size of a chunk and of the cube, whatever the size of the export.
+
+With the SQLite backend (SPORTS_BACKEND=sqlite, or a data path which is a .sqlite/.db file), the cube
+is a StoreCube instead: a handle on the store (see sqlite_store), whose rollups are GROUP BY queries
+with the filters of the views as WHERE clauses, so only the rows of a view are read. With the shared
+backend (SPORTS_BACKEND=shared), it is computed from the columns published in shared memory by a
+loader process (see shared_dataset), without copying them.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from data_loader import (CHUNK_ROWS, DATA_PATH, cache_dir_for, file_signature, iter_csv_chunks, read_appended,
+                         read_columnar_cache, read_position)
+from general_functions import METRIC_COLUMNS, aggregate_statistics, derive_averages, filter_mask
+from shared_dataset import SHARED_ROOT, SharedDataset, current_version
+from sqlite_store import aggregate_store, is_store, open_store
+
+# Where the cube is computed from: "memory" (the csv or its columnar cache), "sqlite" or "shared"
+BACKEND = os.environ.get('SPORTS_BACKEND', 'memory')
+
+# Grain of the cube
+CUBE_LEVELS = ['Type', 'Year', 'Month']
+
+# Columns parsed to build the cube
+CUBE_COLUMNS = CUBE_LEVELS+METRIC_COLUMNS
+
+# Cubes stored by path, together with the signature of the file they were built from and the position
+# up to which it was read (see data_loader.read_position)
+_cache = {}
+_lock = threading.Lock()
+
+# =============================================================================
+
+def build_cube(df):
+
+    return aggregate_statistics(df, CUBE_LEVELS)
+
+# =============================================================================
+
+def categorical_types(cube):
+
+    # Same activity type level as the cube of a loaded frame, where the type is a categorical
+    cube.index = cube.index.set_levels(pd.CategoricalIndex(cube.index.levels[0], name='Type'), level='Type')
+
+    return cube.sort_index()
+
+# =============================================================================
+
+def fold_chunk(cube, chunk):
+    """Adds the activities of chunk to cube (None for an empty cube) and returns the new cube.
+    """
+    chunk_cube = aggregate_statistics(chunk, CUBE_LEVELS)
+
+    # The statistics are additive, so the cells found in both are summed
+    if cube is None:
+        cube = chunk_cube
+    else:
+        cube = pd.concat([cube, chunk_cube]).groupby(level=CUBE_LEVELS, observed=True).sum()
+
+    return categorical_types(cube)
+
+# =============================================================================
+
+def stream_cube(path=DATA_PATH, chunk_rows=CHUNK_ROWS):
+    """Builds the cube of the csv path a chunk of rows at a time, only parsing the columns it needs.
+    """
+    cube = None
+    for chunk in iter_csv_chunks(path, CUBE_COLUMNS, chunk_rows):
+        if len(chunk):
+            cube = fold_chunk(cube, chunk)
+
+    if cube is None:
+        raise ValueError('No activities in '+path)
+
+    return cube
+
+# =============================================================================
+
+def store_cube(path=DATA_PATH, date_range=None):
+    """Builds the whole cube with a GROUP BY query on the SQLite store of path, which is updated first
+    if the csv changed. date_range, (start, end), only keeps the activities of those dates.
+    """
+    return categorical_types(aggregate_store(open_store(path), CUBE_LEVELS, date_range))
+
+# =============================================================================
+
+class StoreCube:
+    """Cube of the SQLite backend, optionally limited to the dates of date_range, (start, end). It is
+    not computed: rollup sends the filters of every view to the store, and only the (Type, Year) pairs
+    with activities are kept, for the options of the selectors.
+    """
+    def __init__(self, store_path, date_range=None):
+        self.store_path = store_path
+        self.date_range = date_range
+        self.cells = aggregate_store(store_path, ['Type', 'Year'], date_range)[['count']]
+
+    @property
+    def empty(self):
+        return self.cells.empty
+
+    def rollup(self, by, **filters):
+        stats = aggregate_store(self.store_path, by, self.date_range, **filters)
+
+        # Same categorical activity type as in the cube of a frame
+        if 'Type' in stats.index.names:
+            if isinstance(stats.index, pd.MultiIndex):
+                stats.index = stats.index.set_levels(
+                    pd.CategoricalIndex(stats.index.levels[stats.index.names.index('Type')], name='Type'),
+                    level='Type')
+            else:
+                stats.index = pd.CategoricalIndex(stats.index, name='Type')
+
+        return derive_averages(stats)
+
+# =============================================================================
+
+def build_cube_from_arrays(columns, types):
+    """Builds the cube from plain arrays, e.g. the read-only columns of a shared dataset, without
+    copying them into a frame. columns has the arrays of the levels (with the codes of the types for
+    'Type') and of the metric columns, and types the categories of the codes.
+    """
+    codes, years, months = columns['Type'], columns['Year'], columns['Month']
+
+    # Number of every (type, year, month) cell, from which every activity gets its cell with bincount
+    first_year = int(years.min()) if len(years) else 0
+    n_years = int(years.max())-first_year+1 if len(years) else 1
+    cell = (codes.astype('int64')*n_years+(years-first_year))*12+(months-1)
+    n_cells = len(types)*n_years*12
+
+    counts = np.bincount(cell, minlength=n_cells)
+
+    # Sums of the metrics, skipping the missing values as pandas does
+    stats = {}
+    for col in METRIC_COLUMNS:
+        values = columns[col]
+        if values.dtype.kind == 'f':
+            values = np.where(np.isnan(values), 0, values)
+        stats[col] = np.bincount(cell, weights=values, minlength=n_cells)
+
+    stats['speed_count'] = np.bincount(cell, weights=~np.isnan(columns['AvgSpeed_km/h']),
+                                       minlength=n_cells).astype('int64')
+
+    # Only the cells with activities are kept
+    present = np.flatnonzero(counts)
+    type_codes, rest = np.divmod(present, n_years*12)
+    year_offsets, month_offsets = np.divmod(rest, 12)
+    index = pd.MultiIndex.from_arrays([pd.Categorical.from_codes(type_codes, categories=types),
+                                       year_offsets+first_year, month_offsets+1], names=CUBE_LEVELS)
+
+    cube = pd.DataFrame({col: values[present] for col, values in stats.items()}, index=index)
+    cube['count'] = counts[present]
+
+    # Integer columns stay integers, as in aggregate_statistics
+    for col in METRIC_COLUMNS:
+        if columns[col].dtype.kind in 'iu':
+            cube[col] = cube[col].astype('int64')
+
+    return cube[METRIC_COLUMNS+['speed_count', 'count']].sort_index()
+
+# =============================================================================
+
+def frame_arrays(df):
+
+    # Columns of the cube of a frame as arrays, with the codes of the types and their categories. The
+    # columns of a frame read from the columnar cache stay the memory-mapped ones, which a groupby would
+    # first copy into blocks
+    types = df['Type'].astype('category').cat
+
+    columns = {col: df[col].to_numpy() for col in CUBE_COLUMNS if col != 'Type'}
+    columns['Type'] = types.codes.to_numpy()
+
+    return columns, list(types.categories)
+
+# =============================================================================
+
+def shared_cube(version):
+
+    # The cube of a version published by shared_dataset
+    dataset = SharedDataset(SHARED_ROOT, version)
+
+    return build_cube_from_arrays(dataset.columns, dataset.categories['Type'])
+
+# =============================================================================
+
+def update_cube(path, signature, cached=None):
+    """Returns the cube of the csv path, and the position up to which the file was read, given the
+    cached (signature, cube, position) of a previous version of the file.
+    """
+    appended = read_appended(path, cached[2], CUBE_COLUMNS) if cached is not None else None
+    if appended is not None:
+        # Delta update: the statistics of the new activities are summed to the ones of their cells
+        rows, position = appended
+        return (fold_chunk(cached[1], rows) if len(rows) else cached[1]), position
+
+    # The memory-mapped columns of the columnar cache are read faster than the text of the csv, and
+    # summed as they are
+    activities_df = read_columnar_cache(cache_dir_for(path), signature)
+    if activities_df is not None:
+        cube = build_cube_from_arrays(*frame_arrays(activities_df))
+    else:
+        cube = stream_cube(path)
+
+    # The file was read up to the size it had before the build, unless it changed meanwhile
+    position = read_position(path, signature[1]) if file_signature(path) == signature else None
+
+    return cube, position
+
+# =============================================================================
+
+def load_cube(path=DATA_PATH):
+    """Returns the cube of the activities in path, shared by all the sessions of the process.
+    When the file changes, only the lines appended since the last read are parsed and added to the
+    cube. It is rebuilt from the start when the file was changed in any other way.
+    """
+    if BACKEND == 'shared':
+        # The version published by the loader process is the signature of the data
+        current = current_version()
+        if current is None:
+            raise RuntimeError('No activities published, run "python shared_dataset.py publish" first')
+        signature = current['version']
+    else:
+        signature = file_signature(path)
+
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        if BACKEND == 'shared':
+            cube, position = shared_cube(signature), None
+
+        elif BACKEND == 'sqlite' or is_store(path):
+            # The store keeps up with the appends to the csv by itself
+            cube, position = StoreCube(open_store(path)), None
+        else:
+            cube, position = update_cube(path, signature, cached)
+
+        _cache[path] = (signature, cube, position)
+
+    return cube
+
+# =============================================================================
+
+def data_version(path=DATA_PATH):
+
+    # Signature of the data of the cube last loaded from path (None before the first load), which
+    # changes with the data
+    cached = _cache.get(path)
+
+    return None if cached is None else cached[0]
+
+# =============================================================================
+
+def rollup(cube, by, **filters):
+    """Sums the cube to the levels in by, after keeping only the cells matching the filters.
+    The filters are given by level name, with a single value or a list of values, e.g.
+        rollup(cube, ['Year', 'Month'], Type='Running', Year=[2021, 2022])
+    The result has the sums of the metric columns, the average speed and the number of activities.
+    """
+    if isinstance(cube, StoreCube):
+        return cube.rollup(by, **filters)
+
+    # Select the cells
+    cells = cube.loc[filter_mask(cube, filters)]
+    cells.index = cells.index.remove_unused_levels()
+
+    # Sum them to the requested levels. Sorting the index also sorts the levels, which otherwise follow
+    # the order in which the activity types appear
+    stats = cells.groupby(level=by, observed=True).sum().sort_index()
+
+    return derive_averages(stats)
+
+# =============================================================================
+
+def activities(cube, year=None):
+
+    # Activity types available, optionally only the ones done in a given year
+    if isinstance(cube, StoreCube):
+        cube = cube.cells
+
+    # A year without activities (e.g. between two seasons) has none, instead of a KeyError from xs
+    if year is not None:
+        cube = cube[cube.index.get_level_values('Year') == year]
+
+    return sorted(cube.index.get_level_values('Type').unique())
+
+# =============================================================================
+
+def years(cube, activity=None):
+
+    # Years available, optionally only the ones in which a given activity was done
+    if isinstance(cube, StoreCube):
+        cube = cube.cells
+
+    if activity is not None:
+        cube = cube[cube.index.get_level_values('Type') == activity]
+
+    return sorted(cube.index.get_level_values('Year').unique())
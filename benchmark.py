@@ -0,0 +1,403 @@
+"""Headless benchmark of the pages of the dashboard.
+
+Every page of page_registry.PAGES is run without a browser: streamlit is replaced by a stub which
+answers the widgets with preset choices and serializes the Bokeh figure the same way st.bokeh_chart
+does. The stub goes through every combination of the selectors of a page (activity, statistic,
+years, ...), including the ones whose options depend on a previous choice. The multiselects get their
+default, each one of their options alone and all of them. The settings of the sidebar shared by every
+page (the date range and the client-side mode) are swept apart: each value is a variant of the pages
+which read it, with its own line in the report, e.g. "monthly_statistics [Last 90 days]".
+
+The sweep is repeated over synthetic datasets of increasing size (see synthetic_data), each one in a
+fresh process, and the report has the latency percentiles and the peak memory of every page. The
+results can be stored as a baseline, to which the next runs are compared.
+Usage:
+    python benchmark.py [--sizes 1000 10000 100000] [--pages module ...] [--save-baseline]
+The timings depend on the machine, so a baseline is only meaningful on the machine it was saved on.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+
+from page_registry import PAGES
+from synthetic_data import write_synthetic_log
+
+# Number of activities of the datasets, the first one is about the size of the real log (rwc.csv)
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+BASELINE_PATH = 'benchmark_baseline.json'
+
+PERCENTILES = [50, 90, 99]
+
+# A page regresses when one of these gets worse than the baseline by more than the tolerance
+COMPARED_MEASURES = ['p50_ms', 'p90_ms', 'peak_mb']
+
+# Differences smaller than this are noise, whatever the relative change
+MIN_DIFFERENCE = {'p50_ms': 1.0, 'p90_ms': 2.0, 'peak_mb': 1.0}
+
+# Values of the settings of the sidebar shared by every page, by the key of their widget, measured as
+# variants of the pages. The default values (all the dates, the views switched by the server) are the
+# plain sweep, and a custom date range defaults to all the dates
+VARIANTS = [('client side', 'client_side', True),
+            ('Last 30 days', 'date_range', 'Last 30 days'),
+            ('Last 90 days', 'date_range', 'Last 90 days'),
+            ('Last 365 days', 'date_range', 'Last 365 days'),
+            ('This season', 'date_range', 'This season')]
+
+SETTINGS = {key for label, key, value in VARIANTS}
+
+# =============================================================================
+
+class StubStreamlit(types.ModuleType):
+    """Stand-in for the streamlit module, which drives the widgets of a page through all their
+    combinations.
+    Each widget returns the option at the current position of an odometer, and the number of options
+    it had is recorded, so advance can move to the next combination after a run of the page.
+    """
+    def __init__(self):
+        super().__init__('streamlit')
+        self.sidebar = self
+        self.choices = []
+        self.option_counts = []
+        self.figures = []
+        self.warnings = []
+
+        # Values of the settings of the variant being run, and the keys of the settings the pages read
+        self.settings = {}
+        self.settings_read = set()
+
+    # Odometer ----------------------------------------------------------------
+
+    def start_run(self):
+        self.option_counts = []
+        self.figures = []
+        self.warnings = []
+
+    def advance(self):
+        """Moves to the next combination of the widgets, returns False when they were all run.
+        """
+        # A run can have less widgets than the previous one (e.g. a page which stops early)
+        del self.choices[len(self.option_counts):]
+
+        for position in reversed(range(len(self.choices))):
+            if self.choices[position]+1 < self.option_counts[position]:
+                self.choices[position] += 1
+                del self.choices[position+1:]
+                return True
+
+        return False
+
+    def _choose(self, options):
+        options = list(options)
+
+        position = len(self.option_counts)
+        if position == len(self.choices):
+            self.choices.append(0)
+        self.option_counts.append(max(len(options), 1))
+
+        return options[self.choices[position]] if options else None
+
+    def _setting(self, key, default):
+        self.settings_read.add(key)
+        return self.settings.get(key, default)
+
+    # Widgets -----------------------------------------------------------------
+
+    def selectbox(self, label, options, index=0, *args, **kwargs):
+        if kwargs.get('key') in SETTINGS:
+            return self._setting(kwargs['key'], list(options)[index])
+        return self._choose(options)
+
+    def radio(self, label, options, *args, **kwargs):
+        return self._choose(options)
+
+    def slider(self, label, min_value=None, max_value=None, value=None, step=None, *args, **kwargs):
+        return self._choose(range(min_value, max_value+1, step or 1))
+
+    def multiselect(self, label, options, default=None, *args, **kwargs):
+        # The subsets of the options are too many to go through: the default, every option alone and
+        # all of them
+        options = list(options)
+        subsets = [list(default) if default is not None else []]+[[option] for option in options]+[options]
+
+        unique = []
+        for subset in subsets:
+            if subset not in unique:
+                unique.append(subset)
+
+        return self._choose(unique)
+
+    def checkbox(self, label, value=False, *args, **kwargs):
+        if kwargs.get('key') in SETTINGS:
+            return self._setting(kwargs['key'], value)
+        return value
+
+    def date_input(self, label, value=None, *args, **kwargs):
+        return value
+
+    def warning(self, body, *args, **kwargs):
+        # A page can stop with a warning instead of a figure (e.g. nothing to compare in a date range)
+        self.warnings.append(body)
+
+    def columns(self, spec, *args, **kwargs):
+        return [self]*(spec if isinstance(spec, int) else len(spec))
+
+    def bokeh_chart(self, figure, use_container_width=False):
+        # Same serialization as streamlit, which is part of the cost of showing the figure
+        from bokeh.embed import json_item
+        self.figures.append(json.dumps(json_item(figure)))
+
+    def show_figure_json(self, figure_json, use_container_width=False):
+        self.figures.append(figure_json)
+
+    def __getattr__(self, name):
+        # Text elements (markdown, info, ...) do not take part in the benchmark
+        return lambda *args, **kwargs: None
+
+# =============================================================================
+
+def install_stub():
+
+    # Must be done before the pages are imported, so their "import streamlit as st" gets the stub
+    stub = StubStreamlit()
+    sys.modules['streamlit'] = stub
+
+    # The cached figures are shown through the internals of streamlit, which the stub does not have
+    import figure_cache
+    figure_cache.show_figure_json = stub.show_figure_json
+
+    return stub
+
+# =============================================================================
+
+def sweep_page(func, stub, title, max_runs=None):
+    """Runs func for every combination of its widgets, and returns the trace of every run.
+    """
+    from instrumentation import trace_page
+
+    traces = []
+    stub.choices = []
+    while True:
+        stub.start_run()
+        with trace_page(title) as trace:
+            func()
+        traces.append(trace)
+
+        if not stub.figures and not stub.warnings:
+            raise RuntimeError(title+' did not show a figure for '+json.dumps(trace.selectors))
+
+        if (max_runs is not None and len(traces) >= max_runs) or not stub.advance():
+            return traces
+
+# =============================================================================
+
+def page_summary(traces, peak_bytes):
+
+    latencies = np.array([trace.total for trace in traces])*1000
+
+    summary = {'runs': len(traces)}
+    for q, value in zip(PERCENTILES, np.percentile(latencies, PERCENTILES)):
+        summary['p'+str(q)+'_ms'] = round(float(value), 3)
+    summary['max_ms'] = round(float(latencies.max()), 3)
+    summary['peak_mb'] = round(peak_bytes/2**20, 3)
+
+    # Median of every stage, to know where the time goes
+    stages = {}
+    for trace in traces:
+        for name, seconds in trace.stages:
+            stages.setdefault(name, []).append(seconds*1000)
+    summary['stages_p50_ms'] = {name: round(float(np.median(values)), 3) for name, values in stages.items()}
+
+    return summary
+
+# =============================================================================
+
+def run_worker(pages, max_runs=None):
+    """Benchmarks the pages on the dataset of this process (SPORTS_DATA_PATH) and returns the
+    results by page.
+    """
+    import importlib
+    import logging
+
+    stub = install_stub()
+
+    # The traces are collected here, not logged
+    logging.getLogger('sports.render').propagate = False
+
+    from activity_cube import load_cube
+
+    # Cold load: stream the csv into the cube (load_cube does not write the columnar cache, so every
+    # size is measured without one)
+    start = time.perf_counter()
+    load_cube()
+    results = {'load_ms': round((time.perf_counter()-start)*1000, 3), 'pages': {}}
+
+    for title, reference in pages:
+        module_name, func_name = reference.split(':')
+        func = getattr(importlib.import_module(module_name), func_name)
+
+        # Warm-up run, so the imports done by the first call are not counted. It also tells which
+        # settings the page reads
+        stub.settings, stub.settings_read = {}, set()
+        sweep_page(func, stub, title, max_runs=1)
+
+        variants = [(module_name, {})]+[(module_name+' ['+label+']', {key: value})
+                                         for label, key, value in VARIANTS if key in stub.settings_read]
+
+        for name, settings in variants:
+            stub.settings = settings
+            results['pages'][name] = sweep_summary(func, stub, title, max_runs)
+
+    return results
+
+# =============================================================================
+
+def sweep_summary(func, stub, title, max_runs=None):
+
+    # Every figure is built in the first sweep, and comes from the figure cache in the second one
+    from figure_cache import figure_cache
+
+    figure_cache.clear()
+    traces = sweep_page(func, stub, title, max_runs)
+    cached_traces = sweep_page(func, stub, title, max_runs)
+
+    # The memory is measured in another sweep, as tracing the allocations slows everything down
+    figure_cache.clear()
+    tracemalloc.start()
+    sweep_page(func, stub, title, max_runs)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    summary = page_summary(traces, peak_bytes)
+    summary['cached_p50_ms'] = round(float(np.median([trace.total for trace in cached_traces]))*1000, 3)
+
+    return summary
+
+# =============================================================================
+
+def benchmark_size(n_rows, modules, max_runs, work_dir, n_types=3, athletes=1):
+
+    # Seeded synthetic log, so the runs of every size are comparable from one benchmark to the next
+    data_path = os.path.join(work_dir, 'activities_'+str(n_rows)+'.csv')
+    write_synthetic_log(data_path, n_rows, seed=0, n_types=n_types, athletes=athletes)
+
+    command = [sys.executable, os.path.abspath(__file__), '--worker']+modules
+    if max_runs is not None:
+        command += ['--max-runs', str(max_runs)]
+
+    # A fresh process per size, so the caches and the peak memory of a size do not leak in the next one
+    env = dict(os.environ, SPORTS_DATA_PATH=data_path)
+    result = subprocess.run(command, env=env, stdout=subprocess.PIPE, universal_newlines=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    if result.returncode != 0:
+        raise RuntimeError('The benchmark of '+str(n_rows)+' activities failed')
+
+    return json.loads(result.stdout)
+
+# =============================================================================
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Returns the measures which got worse than the baseline, as (size, page, measure, before, now).
+    """
+    regressions = []
+    for size, size_results in results.items():
+        for page, summary in size_results['pages'].items():
+            before = baseline.get(size, {}).get('pages', {}).get(page)
+            if before is None:
+                continue
+
+            for measure in COMPARED_MEASURES:
+                limit = max(before[measure]*(1+tolerance), before[measure]+MIN_DIFFERENCE[measure])
+                if summary[measure] > limit:
+                    regressions.append((size, page, measure, before[measure], summary[measure]))
+
+    return regressions
+
+# =============================================================================
+
+def print_report(results):
+
+    header = ['page', 'runs']+['p'+str(q)+' ms' for q in PERCENTILES]+['max ms', 'peak MB', 'cached ms']
+    for size, size_results in results.items():
+        print('\n'+size+' activities (cold load '+format(size_results['load_ms'], '.1f')+' ms)')
+        print(''.join(name.rjust(12) if i else name.ljust(52) for i, name in enumerate(header)))
+
+        for page, summary in size_results['pages'].items():
+            values = [summary['runs']]+[summary['p'+str(q)+'_ms'] for q in PERCENTILES]+\
+                     [summary['max_ms'], summary['peak_mb'], summary.get('cached_p50_ms', float('nan'))]
+            print(page.ljust(52)+''.join(format(value, '.1f' if i else 'd').rjust(12)
+                                         for i, value in enumerate(values)))
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('pages', nargs='*', help='modules of the pages to run (all by default)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='number of activities of the datasets')
+    parser.add_argument('--types', type=int, default=3, help='number of activity types of the datasets')
+    parser.add_argument('--athletes', type=int, default=1, help='number of athletes of the datasets')
+    parser.add_argument('--max-runs', type=int, help='limit of combinations of the selectors per page')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='file of the stored baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown accepted before reporting a regression')
+    parser.add_argument('--json', help='also write the results to this json file')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    pages = [(title, reference) for title, reference in PAGES
+             if not args.pages or reference.split(':')[0] in args.pages]
+
+    if args.worker:
+        json.dump(run_worker(pages, args.max_runs), sys.stdout)
+        return 0
+
+    # The keys are strings, as in the json files
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='sports_benchmark_') as work_dir:
+        for n_rows in args.sizes:
+            results[str(n_rows)] = benchmark_size(n_rows, args.pages, args.max_runs, work_dir,
+                                                      args.types, args.athletes)
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('\nBaseline saved to '+args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for size, page, measure, before, now in regressions:
+        print('REGRESSION '+page+' ('+size+' activities) '+measure+': '+str(before)+' -> '+str(now))
+
+    if not regressions:
+        print('\nNo regressions against '+args.baseline)
+
+    return 1 if regressions else 0
+
+# =============================================================================
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""Switching between the views of a page in the browser, without rerunning the page.
+
+The figures of every view (e.g. of every statistic) are built once on the server and merged by
+switchable_figure into a single figure: the data of all the views goes to one ColumnDataSource, and
+Bokeh selects above the figure pick the view to show with a CustomJS callback, which copies its columns
+to the plotted source and changes the titles, the axis label and the tooltips. Switching views then
+costs no server time and no round trip.
+    switchable_figure({(statistic,): build(statistic) for statistic in STATISTICS},
+                      [('Statistic:', STATISTICS)])
+The mode is optional, the pages use it when the checkbox of client_side_mode is checked.
+"""
+import numpy as np
+import streamlit as st
+
+from general_functions import PRELOADED_TAG, referenced_columns
+
+from bokeh.layouts import column, row
+from bokeh.models import ColumnDataSource, CustomJS, FactorRange, HoverTool, Select, Title
+
+# Statistics of the selectors of the pages
+STATISTICS = ('Count', 'Distance', 'Time')
+
+# Shows the view picked by the selects
+SWITCH_CODE = """
+const view = views[selects.map((select) => select.value).join('|')]
+if (view == null)
+    return
+
+view.renderers.forEach((entry, i) => {
+    const data = {}
+    for (const name in entry.columns)
+        data[name] = store.data[entry.columns[name]].slice(0, entry.length)
+
+    for (const prop in entry.fields)
+        renderers[i].glyph[prop] = {field: entry.fields[prop]}
+
+    renderers[i].data_source.data = data
+})
+
+view.titles.forEach((text, i) => { titles[i].text = text })
+axis.axis_label = view.label
+
+if (hover != null)
+    hover.tooltips = view.tooltips
+if (view.factors != null)
+    x_range.factors = view.factors
+"""
+
+# =============================================================================
+
+def client_side_mode():
+
+    # Same key on every page, so the choice is kept when the page changes
+    return st.sidebar.checkbox('Switch the views in the browser', key='client_side')
+
+# =============================================================================
+
+def figure_titles(fig):
+
+    # The title of the figure, then the other lines of the title added above it
+    return [fig.title]+[model for model in fig.above if isinstance(model, Title)]
+
+# =============================================================================
+
+def column_key(values):
+
+    # Identical columns of different views are stored once
+    if values.dtype == object:
+        return ('object', tuple(values))
+
+    return (values.dtype.str, values.tobytes())
+
+# =============================================================================
+
+def as_array(values):
+
+    # The columns of the sources are arrays, or lists for the ones given directly as lists
+    if isinstance(values, np.ndarray):
+        return values
+
+    array = np.empty(len(values), dtype=object)
+    array[:] = list(values)
+    return array
+
+# =============================================================================
+
+def switchable_figure(figures, selectors):
+    """Merges the figures of several views, built the same way, into the first one, with a select per
+    selector to switch between them in the browser.
+    figures is a dict from the tuple of the values of the selectors to the figure of that view, and
+    selectors a list of (title, options), in the order of the values of the keys.
+    """
+    keys = list(figures)
+    base = figures[keys[0]]
+
+    stored = {}
+    store_columns = {}
+    views = {}
+
+    for key, fig in figures.items():
+        used = referenced_columns(fig)
+
+        renderers = []
+        for renderer in fig.renderers:
+            data = renderer.data_source.data
+
+            # Columns of the view, stored under the name of an identical one when there is one
+            columns = {}
+            for name in data:
+                if name not in used:
+                    continue
+
+                values = as_array(data[name])
+                stored_name = stored.setdefault(column_key(values), 'c'+str(len(stored)))
+                store_columns[stored_name] = values
+                columns[name] = stored_name
+
+            # Fields of the glyph, e.g. the top of the bars which follows the statistic
+            fields = {prop: spec['field'] for prop, spec in
+                      renderer.glyph.to_json(include_defaults=False).items()
+                      if isinstance(spec, dict) and isinstance(spec.get('field'), str)}
+
+            renderers.append({'columns': columns, 'fields': fields,
+                              'length': len(next(iter(data.values()))) if data else 0})
+
+        hover = fig.select_one({'type': HoverTool})
+
+        views['|'.join(str(value) for value in key)] = {
+            'renderers': renderers,
+            'titles': [title.text for title in figure_titles(fig)],
+            'label': fig.yaxis[0].axis_label,
+            'tooltips': [list(tooltip) for tooltip in hover.tooltips] if hover is not None else None,
+            'factors': list(fig.x_range.factors) if isinstance(fig.x_range, FactorRange) else None}
+
+    # The columns of the views have different lengths, the store has the longest one and every view
+    # only reads its own length
+    n_rows = max((len(values) for values in store_columns.values()), default=0)
+    for name, values in store_columns.items():
+        if values.dtype == object:
+            padded = np.full(n_rows, None, dtype=object)
+        else:
+            padded = np.zeros(n_rows, dtype=values.dtype)
+        padded[:len(values)] = values
+        store_columns[name] = padded
+
+    # The columns are read by the callback, not by a glyph, so slim_sources must keep them
+    store = ColumnDataSource(store_columns, tags=[PRELOADED_TAG])
+
+    # One select per selector, starting on the view of the base figure
+    selects = [Select(title=title, value=str(value), options=[str(option) for option in options])
+               for (title, options), value in zip(selectors, keys[0])]
+
+    callback = CustomJS(args={'views': views, 'store': store, 'selects': selects,
+                              'renderers': list(base.renderers), 'titles': figure_titles(base),
+                              'axis': base.yaxis[0], 'hover': base.select_one({'type': HoverTool}),
+                              'x_range': base.x_range},
+                        code=SWITCH_CODE)
+    for select in selects:
+        select.js_on_change('value', callback)
+
+    return column(row(*selects), base, sizing_mode=base.sizing_mode)
+
+# =============================================================================
+
+def statistic_switch(build):
+
+    # Figure of a page whose only view switched in the browser is the statistic
+    return switchable_figure({(statistic,): build(statistic) for statistic in STATISTICS},
+                             [('Statistic:', STATISTICS)])
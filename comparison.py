@@ -0,0 +1,156 @@
+"""Engine for the pages comparing several (activity, year) series month by month.
+
+comparison_frame builds, in one step, the curated dataframe with the 12 months of every series and
+comparison_figure renders it as grouped bars, whatever the number of series (two years of an
+activity, two activities in a year, the last seasons, ...).
+"""
+import numpy as np
+
+from general_functions import MONTH_NAMES, define_counter_name, format_duration
+from instrumentation import stage
+from queries import comparison
+
+from bokeh.models import ColumnDataSource, FactorRange, Title
+from bokeh.palettes import Category10
+from bokeh.plotting import figure
+
+# =============================================================================
+
+def series_labels(series):
+
+    # Name of each series in the x-axis: the year when all the series are of the same activity, the
+    # activity when they are all from the same year, and both otherwise
+    if len({activity for activity, year in series}) == 1:
+        return [str(year) for activity, year in series]
+    elif len({year for activity, year in series}) == 1:
+        return [str(activity) for activity, year in series]
+    else:
+        return [str(activity)+' '+str(year) for activity, year in series]
+
+# =============================================================================
+
+def comparison_frame(cube, series, colors=None, labels=None):
+    """Curated dataframe with the 12 months of every (activity, year) in series, in that order.
+    Each series gets one color (colors, or a palette by default) and one label in the x-axis (labels,
+    or the ones from series_labels by default).
+    """
+    if colors is None:
+        palette = Category10[10]
+        colors = [palette[i % len(palette)] for i in range(len(series))]
+
+    if labels is None:
+        labels = series_labels(series)
+
+    with stage('aggregate'):
+        # The 12 months of every series, computed at once
+        df_to_plot = comparison(cube, series)
+
+    with stage('labels'):
+        # Color and time labels columns, only for the months with activities
+        has_activities = df_to_plot['count'].to_numpy() > 0
+        df_to_plot['color'] = np.where(has_activities, np.repeat(np.array(colors, dtype=object), 12), None)
+        df_to_plot['time_spent'] = np.where(has_activities, format_duration(df_to_plot.Time_h, 'hm'), None)
+
+        # List which will be on the x-axis
+        df_to_plot['x-axis'] = list(zip(np.tile(MONTH_NAMES, len(series)), np.repeat(labels, 12)))
+
+    return df_to_plot
+
+# =============================================================================
+
+def statistic_column(statistic):
+
+    # Column with the height of the bars for the chosen statistic
+    if statistic == 'Distance':
+        return 'Distance_km'
+    elif statistic == 'Time':
+        return 'Time_h'
+    else:
+        return 'count'
+
+# =============================================================================
+
+def distance_verb(activity):
+
+    if activity == 'Walking':
+        return 'Walked'
+    elif activity == 'Cycling':
+        return 'Cycled'
+    else:
+        return 'Run'
+
+# =============================================================================
+
+def comparison_figure(df_to_plot, statistic, title, title_ending, y_axis_label, counter_name=None):
+
+    with stage('figure'):
+        # Set the source as the curated dataframe
+        source = ColumnDataSource(df_to_plot)
+
+        if counter_name is None:
+            counter_name = 'Number of activities'
+
+        # Information when the mouse is hovered over the bars
+        tooltips = [('Distance', "@Distance_km{0,0.00} km"), ('Time', "@time_spent"),
+                    ("Calories burned","@Calories{0,0}"),
+                    ("Cumulative Elevation Gain", "@ElevGain_m{0,0} m"),
+                    ("Average Speed", "@avg_speed{0.00} km/h"), (counter_name, "@count")]
+
+        # Instantiate the figure
+        comparison_fig = figure(y_axis_label=y_axis_label, tooltips=tooltips,
+                                plot_width=900, plot_height=500, tools='save',
+                                x_range=FactorRange(*df_to_plot['x-axis']))
+
+        # Add the ending of the title before so that it is below the other
+        comparison_fig.add_layout(Title(text=title_ending, text_font_size='20px', align='center'),
+                                  'above')
+
+        # Add the first line of the title
+        comparison_fig.add_layout(Title(text=title, text_font_size='20px', align='center'), 'above')
+
+        # Vertical bars, with the height based on the chosen statistic
+        comparison_fig.vbar(x='x-axis', top=statistic_column(statistic), width=0.9, color='color',
+                            source=source)
+
+        # Remove unnecessary graph elements
+        # Remove gridlines
+        comparison_fig.xgrid.grid_line_color, comparison_fig.ygrid.grid_line_color = None, None
+
+        # Remove x axis minor ticks
+        comparison_fig.xaxis.minor_tick_line_color = None
+
+        # Remove outline line
+        comparison_fig.outline_line_color = None
+
+        # Start of the y range
+        comparison_fig.y_range.start = 0
+
+        # Range padding of the x-axis
+        comparison_fig.x_range.range_padding = 0.1
+
+        # Rotate the labels of the years
+        comparison_fig.xaxis.major_label_orientation = 1
+
+    return comparison_fig
+
+# =============================================================================
+
+def activity_titles(activity, statistic, title_beginning):
+
+    # Title and y-axis label of the comparisons of a single activity
+    counter_name = define_counter_name(activity)
+
+    if statistic == 'Time':
+        title = title_beginning+'Time Spent '+activity
+        label = 'Hours' # Y-axis label
+
+    # If the chosen statistic is Distance
+    elif statistic == 'Distance':
+        title = title_beginning+'Number of Kilometers '+distance_verb(activity)+' per Month'
+        label = 'Kilometers'
+
+    else:
+        title = title_beginning+counter_name+' per Month'
+        label = counter_name
+
+    return title, label, counter_name
@@ -0,0 +1,335 @@
+"""Readers of the activity dataset: the csv, in one go or in chunks, the lines appended to it since a
+given position, and its binary columnar cache.
+
+The pages do not read the activities, they use the cube of activity_cube, which is built with these
+readers. The columnar cache is a copy of the csv next to it (one .npy file per column with compact
+dtypes), which the processes memory-map instead of parsing the text. Nothing writes it while the
+dashboard runs, as that would hold all the activities in memory: it is written by the ingestion step,
+before the dashboard starts and again when the csv is replaced:
+    python data_loader.py [path/to/activities.csv]
+Without a cache of the current version of the csv, the cube is built by streaming the csv instead.
+
+The dashboard reads rwc.csv by default, another file can be served by setting the SPORTS_DATA_PATH
+environment variable before the process starts.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Default location of the activity log
+DATA_PATH = os.environ.get('SPORTS_DATA_PATH', 'rwc.csv')
+
+# Version of the layout of the columnar cache, a cache written with another version is rebuilt
+CACHE_FORMAT = 2
+
+# Number of rows parsed at a time by the streaming reader (iter_csv_chunks)
+CHUNK_ROWS = 200000
+
+# Bytes read at a time when hashing the part of the file which was already read, to check that an
+# appended file still has that content
+HASH_BLOCK = 2**20
+
+# =============================================================================
+
+def file_signature(path=DATA_PATH):
+
+    # The modification time and the size are enough to know if the file changed since the last read
+    stat = os.stat(path)
+
+    return stat.st_mtime_ns, stat.st_size
+
+# =============================================================================
+
+def cache_dir_for(path=DATA_PATH):
+
+    # rwc.csv -> rwc_cache
+    return os.path.splitext(path)[0]+'_cache'
+
+# =============================================================================
+
+def downcast_numeric(df):
+
+    # Years, months and the parts of the duration fit in int8/int16. The measurements stay in double
+    # precision: they are summed and shown, and in single precision the sums move in their last decimal
+    # (e.g. 51.69 km of running in April 2019 instead of 51.68)
+    for col in df.columns:
+        if col in ('Date', 'Type'):
+            continue
+        if pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+
+    return df
+
+# =============================================================================
+
+def optimize_dtypes(df):
+
+    # The activity type has only a handful of distinct values, so it is stored as a categorical
+    df['Type'] = df['Type'].astype('category')
+
+    return downcast_numeric(df)
+
+# =============================================================================
+
+def read_csv_activities(path=DATA_PATH):
+
+    df = pd.read_csv(path, index_col=0, parse_dates=['Date'])
+
+    return optimize_dtypes(df)
+
+# =============================================================================
+
+class ColumnarCacheWriter:
+    """Writes the columnar cache chunk by chunk, for frames which are produced in pieces (e.g. too big
+    to be held in memory at once).
+    The number of rows and the dtypes of the columns must be known before the first chunk, with the
+    categorical columns given as a pd.CategoricalDtype with all their categories:
+        writer = ColumnarCacheWriter(cache_dir, n_rows, {'Type': pd.CategoricalDtype(types), ...})
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.close(file_signature(path))
+    """
+    def __init__(self, cache_dir, n_rows, dtypes, index_dtype='int64', index_name=None):
+        self.cache_dir = cache_dir
+        self.n_rows = n_rows
+        self.position = 0
+
+        # The cache is written to a temporary directory which then replaces the previous one, so a
+        # reader never sees a half written cache
+        self.parent = os.path.dirname(os.path.abspath(cache_dir))
+        self.tmp_dir = tempfile.mkdtemp(dir=self.parent, prefix='.tmp_cache_')
+
+        self.meta = {'format': CACHE_FORMAT, 'signature': None, 'index_name': index_name,
+                     'columns': [], 'categories': {}}
+
+        self.index = np.lib.format.open_memmap(os.path.join(self.tmp_dir, 'index.npy'), mode='w+',
+                                               dtype=np.dtype(index_dtype), shape=(n_rows,))
+
+        self.columns = []
+        for i, (col, dtype) in enumerate(dtypes.items()):
+            # Column names like 'AvgSpeed_km/h' are not valid file names, so the files are numbered
+            file_name = str(i)+'.npy'
+
+            if isinstance(dtype, pd.CategoricalDtype):
+                # Only the codes are stored in binary, the categories go to the metadata
+                categories = dtype.categories
+                dtype = pd.Categorical([], categories=categories).codes.dtype
+                self.meta['categories'][col] = [str(cat) for cat in categories]
+            else:
+                categories = None
+
+            values = np.lib.format.open_memmap(os.path.join(self.tmp_dir, file_name), mode='w+',
+                                               dtype=np.dtype(dtype), shape=(n_rows,))
+            self.columns.append((col, values, categories))
+            self.meta['columns'].append({'name': col, 'file': file_name})
+
+    def write(self, chunk):
+        """Appends the rows of chunk, which must have the columns given to the constructor.
+        """
+        end = self.position+len(chunk)
+        if end > self.n_rows:
+            raise ValueError('More rows than the '+str(self.n_rows)+' announced')
+
+        self.index[self.position:end] = chunk.index.to_numpy()
+
+        for col, values, categories in self.columns:
+            if categories is not None:
+                values[self.position:end] = pd.Categorical(chunk[col], categories=categories).codes
+            else:
+                values[self.position:end] = chunk[col].to_numpy()
+
+        self.position = end
+
+    def close(self, signature):
+        """Publishes the cache, as built from the file with the given signature.
+        """
+        if self.position != self.n_rows:
+            self.abort()
+            raise ValueError('Only '+str(self.position)+' of the '+str(self.n_rows)+' rows were written')
+
+        # Flush the memory maps before the directory is moved
+        self.index.flush()
+        for col, values, categories in self.columns:
+            values.flush()
+        self.index, self.columns = None, []
+
+        self.meta['signature'] = list(signature)
+        with open(os.path.join(self.tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(self.meta, f)
+
+        # Swap the directories
+        old_dir = None
+        if os.path.exists(self.cache_dir):
+            old_dir = tempfile.mkdtemp(dir=self.parent, prefix='.old_cache_')
+            os.replace(self.cache_dir, os.path.join(old_dir, 'cache'))
+        os.replace(self.tmp_dir, self.cache_dir)
+
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def abort(self):
+
+        self.index, self.columns = None, []
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+# =============================================================================
+
+def iter_csv_chunks(path=DATA_PATH, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yields the activities of the csv path in frames of at most chunk_rows rows, with only the given
+    columns (all by default), so a file of any size is read with a bounded amount of memory.
+    The numeric columns get the same dtypes as in read_csv_activities, but the activity type is left as
+    strings, as the categories of a chunk are not the ones of the whole file.
+    """
+    parse_dates = ['Date'] if columns is None or 'Date' in columns else False
+
+    for chunk in pd.read_csv(path, index_col=0 if columns is None else None, usecols=columns,
+                             parse_dates=parse_dates, chunksize=chunk_rows):
+        yield downcast_numeric(chunk)
+
+# =============================================================================
+
+def prefix_digest(f, offset):
+
+    # Hash of the first offset bytes of the file, read a block at a time. Hashing is a sequential read,
+    # much faster than parsing the same bytes
+    digest = hashlib.sha1()
+
+    f.seek(0)
+    remaining = offset
+    while remaining > 0:
+        block = f.read(min(HASH_BLOCK, remaining))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+
+    return digest
+
+# =============================================================================
+
+def read_position(path, offset):
+    """Position of a reader which has read the first offset bytes of the csv path (usually all of it,
+    offset being the size given by file_signature), to be given later to read_appended.
+    """
+    with open(path, 'rb') as f:
+        prefix = prefix_digest(f, offset).hexdigest()
+
+        f.seek(max(offset-1, 0))
+        last_byte = f.read(1) if offset else b''
+
+    # A last line without its end of line may still be being written, so it can not be the start of an
+    # append (None makes the next read a full one)
+    if last_byte != b'\n':
+        return None
+
+    return {'offset': offset, 'prefix': prefix}
+
+# =============================================================================
+
+def read_appended(path, position, columns=None):
+    """Reads the lines added to the csv path after position (see read_position), and returns them
+    with the new position, as (frame, position).
+    Returns None when the file was not only appended to (truncated, edited, replaced), in which case it
+    has to be read again from the start. All the bytes read before are hashed again and compared, so
+    an edit anywhere in them is detected, whether the file grew or not.
+    """
+    # Positions of an older version only sampled some windows of the file
+    if position is None or 'prefix' not in position:
+        return None
+
+    with open(path, 'rb') as f:
+        # The signature of the file changed (otherwise it would not be read again), without any new
+        # byte: it was truncated or rewritten in place
+        size = os.fstat(f.fileno()).st_size
+        if size <= position['offset']:
+            return None
+
+        digest = prefix_digest(f, position['offset'])
+        if digest.hexdigest() != position['prefix']:
+            return None
+
+        f.seek(0)
+        header = f.readline().decode()
+
+        f.seek(position['offset'])
+        tail = f.read(size-position['offset'])
+
+    # Only the complete lines are read, a line still being written is left for the next time
+    tail = tail[:tail.rfind(b'\n')+1]
+
+    # The hash of the new position continues the one of the bytes already read
+    digest.update(tail)
+    new_position = {'offset': position['offset']+len(tail), 'prefix': digest.hexdigest()}
+
+    # The header goes first, so the columns are named and found as in the whole file
+    frame = pd.read_csv(io.BytesIO(header.encode()+tail), usecols=columns,
+                        index_col=0 if columns is None else None,
+                        parse_dates=['Date'] if columns is None or 'Date' in columns else False)
+
+    return downcast_numeric(frame), new_position
+
+# =============================================================================
+
+def write_columnar_cache(df, cache_dir, signature):
+
+    writer = ColumnarCacheWriter(cache_dir, len(df), df.dtypes.to_dict(), df.index.dtype, df.index.name)
+    writer.write(df)
+    writer.close(signature)
+
+# =============================================================================
+
+def read_columnar_cache(cache_dir, signature=None):
+
+    # Returns None when there is no cache or when it does not belong to the current version of the file
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('format') != CACHE_FORMAT:
+        return None
+    if signature is not None and tuple(meta['signature']) != tuple(signature):
+        return None
+
+    # Memory-map the columns, so only the pages of the files which are used get loaded
+    index = pd.Index(np.load(os.path.join(cache_dir, 'index.npy'), mmap_mode='r'), name=meta['index_name'])
+
+    columns = []
+    for col in meta['columns']:
+        values = np.load(os.path.join(cache_dir, col['file']), mmap_mode='r')
+
+        if col['name'] in meta['categories']:
+            values = pd.Categorical.from_codes(values, categories=meta['categories'][col['name']])
+
+        columns.append(pd.Series(values, index=index, name=col['name'], copy=False))
+
+    # pd.DataFrame(dict) would consolidate the columns of the same dtype into blocks, copying them. The
+    # frame is kept with one block per mapped column instead, which pandas consolidates (copies) only
+    # when an operation asks for it, e.g. a groupby
+    return pd.concat(columns, axis=1, copy=False)
+
+# =============================================================================
+
+def build_columnar_cache(path=DATA_PATH):
+
+    # Ingestion step: parse the csv and store it in the binary format
+    signature = file_signature(path)
+    df = read_csv_activities(path)
+    write_columnar_cache(df, cache_dir_for(path), signature)
+
+    return df
+
+# =============================================================================
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    build_columnar_cache(source)
+    print('Columnar cache written to '+cache_dir_for(source))
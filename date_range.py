@@ -0,0 +1,261 @@
+"""Date ranges of the activities, e.g. the last 90 days or this season, for every page.
+
+The cube is at the month grain, so the cube of a date range is built from the activities themselves.
+They are kept by a DateIndex in the order of their dates (once per version of the data, without any
+copy when the csv is already in chronological order), so the activities of any range are one
+contiguous slice, found with two binary searches (np.searchsorted) instead of a scan of the whole
+history. The index is built from the memory-mapped columnar cache of the csv when it is up to date (see
+data_loader), otherwise only the columns of the cube and the dates are parsed from the csv, as for the
+cube itself. Only the slice of a range is summed into its cube:
+    cube = range_cube(date(2022, 1, 1), date(2022, 6, 30))
+With the SQLite backend, the range is a condition on the Date column of the store, which is indexed.
+
+The pages get the cube of the range chosen in the sidebar with page_cube (see date_range_selector).
+The relative ranges end at the date of the last activity, not at today, so an old export still shows
+its last 90 days.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from activity_cube import (BACKEND, CUBE_COLUMNS, StoreCube, build_cube_from_arrays, data_version,
+                           frame_arrays, load_cube)
+from data_loader import DATA_PATH, cache_dir_for, iter_csv_chunks, read_columnar_cache
+from shared_dataset import SHARED_ROOT, SharedDataset
+from sqlite_store import date_bounds, is_store, open_store
+
+# Ranges of the selector, the relative ones in days before the last activity
+PRESETS = ('All time', 'Last 30 days', 'Last 90 days', 'Last 365 days', 'This season', 'Custom')
+PRESET_DAYS = {'Last 30 days': 30, 'Last 90 days': 90, 'Last 365 days': 365}
+
+# Cubes of ranges kept per version of the data
+RANGE_CUBES = 32
+
+# DateIndex stored by path, together with the version of the data it was built from
+_indexes = {}
+_lock = threading.Lock()
+
+# =============================================================================
+
+class DateIndex:
+    """The columns of the cube of every activity, sorted by date, with the cubes of the last ranges
+    asked for.
+    """
+    def __init__(self, dates, columns, types):
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+
+        # Logs are usually written in chronological order, then the columns are used as they are.
+        # Otherwise they are sorted once, with the activities without a date at the end
+        if len(dates) and not (dates[1:] >= dates[:-1]).all():
+            order = np.argsort(dates, kind='stable')
+            dates = dates[order]
+            columns = {col: np.asarray(values)[order] for col, values in columns.items()}
+
+        self.dates = dates
+        self.columns = {col: np.asarray(values) for col, values in columns.items()}
+        self.types = types
+
+        dated = dates[~np.isnat(dates)]
+        self.first = pd.Timestamp(dated[0]).date() if len(dated) else None
+        self.last = pd.Timestamp(dated[-1]).date() if len(dated) else None
+
+        self.cubes = OrderedDict()
+        self.cubes_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.dates)
+
+    def positions(self, start=None, end=None):
+        """First and last+1 positions of the activities from start to end (dates, both included, None
+        for no bound).
+        """
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, 'ns'), 'left'))
+
+        # Every time of the last day is included
+        after = np.datetime64('NaT') if end is None else np.datetime64(end+datetime.timedelta(days=1), 'ns')
+        hi = int(np.searchsorted(self.dates, after, 'left'))
+
+        return lo, max(lo, hi)
+
+    def slice(self, start=None, end=None):
+        # Views of the columns, the activities are contiguous
+        lo, hi = self.positions(start, end)
+
+        return {col: values[lo:hi] for col, values in self.columns.items()}
+
+    def cube(self, start=None, end=None):
+        """Cube of the activities from start to end, only summing their slice.
+        """
+        key = (start, end)
+        with self.cubes_lock:
+            if key in self.cubes:
+                self.cubes.move_to_end(key)
+                return self.cubes[key]
+
+        cube = build_cube_from_arrays(self.slice(start, end), self.types)
+
+        with self.cubes_lock:
+            self.cubes[key] = cube
+            while len(self.cubes) > RANGE_CUBES:
+                self.cubes.popitem(last=False)
+
+        return cube
+
+# =============================================================================
+
+def build_date_index(path, version):
+
+    # The published columns are already arrays, the types as codes
+    if BACKEND == 'shared':
+        dataset = SharedDataset(SHARED_ROOT, version)
+        columns = {col: dataset.columns[col] for col in CUBE_COLUMNS}
+        return DateIndex(dataset.columns['Date'], columns, dataset.categories['Type'])
+
+    # The version of the csv is its signature. Without a columnar cache of that version, the whole
+    # activities are not needed, only the columns of the cube and the dates
+    activities_df = read_columnar_cache(cache_dir_for(path), version)
+    if activities_df is None:
+        activities_df = pd.concat(iter_csv_chunks(path, CUBE_COLUMNS+['Date']), ignore_index=True)
+
+    columns, categories = frame_arrays(activities_df)
+
+    # The types in the order of the cube of all the activities, which is the order of the selectors
+    order = list(load_cube(path).index.get_level_values('Type').unique())
+    types = pd.Categorical.from_codes(columns['Type'], categories)
+    types = types.set_categories(order+[activity for activity in categories if activity not in order])
+    columns['Type'] = types.codes
+
+    return DateIndex(activities_df['Date'].to_numpy(), columns, list(types.categories))
+
+# =============================================================================
+
+def load_date_index(path=DATA_PATH):
+    """Returns the DateIndex of the current version of the activities in path, shared by all the
+    sessions of the process.
+    """
+    load_cube(path)
+    version = data_version(path)
+
+    cached = _indexes.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _indexes.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        index = build_date_index(path, version)
+        _indexes[path] = (version, index)
+
+    return index
+
+# =============================================================================
+
+def uses_store(path):
+
+    return BACKEND == 'sqlite' or is_store(path)
+
+# =============================================================================
+
+def activity_dates(path=DATA_PATH):
+
+    # Dates of the first and of the last activity
+    if uses_store(path):
+        return date_bounds(open_store(path))
+
+    index = load_date_index(path)
+    return index.first, index.last
+
+# =============================================================================
+
+def range_cube(start=None, end=None, path=DATA_PATH):
+    """Cube of the activities in path from start to end (dates, both included, None for no bound).
+    """
+    if start is None and end is None:
+        return load_cube(path)
+
+    if uses_store(path):
+        return StoreCube(open_store(path), (start, end))
+
+    return load_date_index(path).cube(start, end)
+
+# =============================================================================
+
+def preset_range(preset, first, last):
+
+    # (start, end) of a relative range of the selector, None for all the activities
+    if preset in PRESET_DAYS:
+        return max(first, last-datetime.timedelta(days=PRESET_DAYS[preset]-1)), last
+
+    if preset == 'This season':
+        return max(first, datetime.date(last.year, 1, 1)), last
+
+    return None
+
+# =============================================================================
+
+def date_range_selector(path=DATA_PATH):
+    """Sidebar widgets of the date range, the same on every page. Returns (start, end), or None for
+    all the activities.
+    """
+    preset = st.sidebar.selectbox('Dates:', PRESETS, key='date_range')
+
+    # All the activities do not need the dates, nor the index
+    if preset == 'All time':
+        return None
+
+    first, last = activity_dates(path)
+    if first is None:
+        return None
+
+    if preset != 'Custom':
+        return preset_range(preset, first, last)
+
+    dates = st.sidebar.date_input('From - to:', value=(first, last), min_value=first, max_value=last,
+                                  key='date_range_custom')
+
+    # While the range is being picked only its start is set
+    if not isinstance(dates, (list, tuple)):
+        dates = [dates]
+    if not dates:
+        return None
+
+    start, end = dates[0], (dates[-1] if len(dates) > 1 else last)
+    if (start, end) == (first, last):
+        return None
+
+    return start, end
+
+# =============================================================================
+
+def page_cube(path=DATA_PATH):
+    """Cube of the date range chosen in the sidebar, and that range (None for all the activities).
+    The cube is None, after a warning, when the range has no activities.
+    """
+    date_range = date_range_selector(path)
+    if date_range is None:
+        return load_cube(path), None
+
+    cube = range_cube(*date_range, path=path)
+    if cube.empty:
+        st.warning('No activities from '+str(date_range[0])+' to '+str(date_range[1])+'.')
+        return None, date_range
+
+    return cube, date_range
+
+# =============================================================================
+
+def year_slider(container, label, year_options):
+
+    # A slider needs two different years, a range within a single year just shows it
+    first, last = int(min(year_options)), int(max(year_options))
+    if first == last:
+        container.markdown(label.rstrip(':')+': '+str(first))
+        return first
+
+    return container.slider(label, first, last, step=1)
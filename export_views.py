@@ -0,0 +1,300 @@
+"""Batch export of every view of the dashboard to standalone HTML files, and to PNG when possible.
+
+Every page with a <function>_views generator (see page_registry) is exported for every combination of
+its selectors, with the same builders as the dashboard, so the files show what the pages show:
+    python export_views.py [out_dir] [--pages module ...] [--workers N] [--inline] [--no-png]
+The views are split among a pool of processes, each one loading the activities once. The output
+directory gets one folder per page, an index.html linking every view and an export.json manifest with
+the content hash, the page and the label of every view: a view whose figure did not change is not
+written again (nor its PNG taken again), so exporting after a small change of the data only rewrites
+the views it touched. Exporting some of the pages (--pages) leaves the views of the others as they are,
+in the directory, the manifest and the index.
+
+The PNG files need selenium and a browser driver (geckodriver or chromedriver) on the machine, the
+export only writes the HTML files when they are missing.
+"""
+import argparse
+import hashlib
+import html
+import importlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from activity_cube import load_cube
+from data_loader import DATA_PATH
+from general_functions import slim_sources
+from page_registry import PAGES
+
+logger = logging.getLogger('sports.export')
+
+MANIFEST = 'export.json'
+
+# State of a worker process: its cube, the views of its pages and its browser driver (False when the
+# PNG export is not available)
+_worker = {}
+
+# =============================================================================
+
+def view_name(selectors):
+
+    # File name of a view, from the values of its selectors, e.g. Running_Count_2019_2020
+    parts = []
+    for value in selectors:
+        values = value if isinstance(value, (list, tuple)) else [value]
+        parts += [re.sub(r'[^A-Za-z0-9.-]+', '-', str(item)) for item in values]
+
+    return '_'.join(parts) or 'view'
+
+# =============================================================================
+
+def content_hash(item):
+    """Hash of a figure serialized by bokeh.embed.json_item, which does not depend on the ids Bokeh gave
+    to its models: they are numbered again in the order they are reached from the root.
+    """
+    roots = item['doc']['roots']
+    references = {reference['id']: reference for reference in roots['references']}
+    ids = {}
+
+    def visit(model_id):
+        if model_id in ids:
+            return
+        ids[model_id] = len(ids)
+        if model_id in references:
+            walk(references[model_id]['attributes'])
+
+    def walk(value):
+        if isinstance(value, dict):
+            if list(value) == ['id']:
+                visit(value['id'])
+            for key in sorted(value):
+                walk(value[key])
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    for root_id in roots['root_ids']:
+        visit(root_id)
+
+    def renumber(value):
+        if isinstance(value, dict):
+            return {key: ids.get(item, item) if key == 'id' else renumber(item)
+                    for key, item in value.items()}
+        elif isinstance(value, list):
+            return [renumber(item) for item in value]
+        return value
+
+    canonical = sorted((ids[reference['id']], reference['type'], renumber(reference['attributes']))
+                       for reference in references.values() if reference['id'] in ids)
+
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+# =============================================================================
+
+def init_worker(path):
+
+    # The cube of the worker, loaded once for all its views
+    _worker['cube'] = load_cube(path)
+    _worker['views'] = {}
+
+# =============================================================================
+
+def page_views(reference):
+
+    # Views of a page, (page key, selectors, builder), enumerated once per process
+    views = _worker['views'].get(reference)
+    if views is None:
+        module_name, func_name = reference.split(':')
+        views = list(getattr(importlib.import_module(module_name), func_name+'_views')(_worker['cube']))
+        _worker['views'][reference] = views
+
+    return views
+
+# =============================================================================
+
+def png_driver():
+
+    # One browser per worker, created on first use. Without selenium or a driver there is no PNG
+    if 'driver' not in _worker:
+        try:
+            from bokeh.io.webdriver import webdriver_control
+            _worker['driver'] = webdriver_control.get()
+        except Exception as error:
+            logger.info('No PNG export: %s', error)
+            _worker['driver'] = False
+
+    return _worker['driver']
+
+# =============================================================================
+
+def export_view(task):
+    """Exports one view in a worker. task is (reference, position of the view in the views of the page,
+    its selectors, title of the page, output directory, hash of the last export, inline, png). Returns
+    the relative path of the HTML file, its content hash and what was written.
+    """
+    from bokeh.embed import file_html, json_item
+    from bokeh.resources import CDN, INLINE
+
+    reference, position, selectors, title, out_dir, previous_hash, inline, png = task
+    page, view_selectors, build = page_views(reference)[position]
+
+    if tuple(view_selectors) != tuple(selectors):
+        raise RuntimeError('The activities changed during the export of '+page)
+
+    fig = slim_sources(build())
+    digest = content_hash(json_item(fig))
+
+    relative_path = os.path.join(page, view_name(selectors)+'.html')
+    html_path = os.path.join(out_dir, relative_path)
+    png_path = os.path.splitext(html_path)[0]+'.png'
+
+    written = {'html': False, 'png': False}
+
+    if digest != previous_hash or not os.path.exists(html_path):
+        os.makedirs(os.path.dirname(html_path), exist_ok=True)
+        view_title = title+' - '+', '.join(str(value) for value in selectors)
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(file_html(fig, INLINE if inline else CDN, view_title))
+        written['html'] = True
+
+    if png and (written['html'] or not os.path.exists(png_path)):
+        driver = png_driver()
+        if driver:
+            from bokeh.io import export_png
+            export_png(fig, filename=png_path, webdriver=driver)
+            written['png'] = True
+
+    return relative_path, digest, written
+
+# =============================================================================
+
+def read_manifest(manifest_path):
+
+    # {relative path: {'hash', 'page', 'label'}} of the last export. The manifests of older exports only
+    # have the hashes, the page of a view is then its folder and its label the name of its file
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    for relative_path, entry in manifest.items():
+        if isinstance(entry, str):
+            manifest[relative_path] = {'hash': entry, 'page': os.path.dirname(relative_path),
+                                       'label': os.path.splitext(os.path.basename(relative_path))[0]}
+
+    return manifest
+
+# =============================================================================
+
+def write_index(out_dir, views, pages):
+
+    # One section per page, with a link to every view (and to its PNG when there is one)
+    titles = dict((reference.split(':')[0], title) for title, reference in pages)
+
+    sections = []
+    for page in sorted(views, key=lambda page: titles.get(page, page)):
+        items = []
+        for relative_path, label in views[page]:
+            png_path = os.path.splitext(relative_path)[0]+'.png'
+            link = '<a href="'+html.escape(relative_path)+'">'+html.escape(label)+'</a>'
+            if os.path.exists(os.path.join(out_dir, png_path)):
+                link += ' (<a href="'+html.escape(png_path)+'">png</a>)'
+            items.append('<li>'+link+'</li>')
+
+        sections.append('<h2>'+html.escape(titles.get(page, page))+'</h2>\n<ul>\n'+'\n'.join(items)+'\n</ul>')
+
+    with open(os.path.join(out_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>Sports Visualizations</title>'
+                '</head>\n<body>\n<h1>Sports Visualizations</h1>\n'+'\n'.join(sections)+'\n</body>\n</html>\n')
+
+# =============================================================================
+
+def export_all(out_dir, pages=PAGES, path=DATA_PATH, workers=None, inline=False, png=True):
+    """Exports every view of pages to out_dir, returns the number of views, of HTML files written and of
+    PNG files written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = read_manifest(manifest_path)
+
+    # The views are enumerated here to split them, and built again by the workers, which only receive
+    # their position (the builders hold the cube, which is better loaded by every worker than pickled)
+    cube = load_cube(path)
+    tasks, labels = [], {}
+    exported = set()
+    for title, reference in pages:
+        module_name, func_name = reference.split(':')
+        views = getattr(importlib.import_module(module_name), func_name+'_views', None)
+        if views is None:
+            continue
+        exported.add(module_name)
+
+        for position, (page, selectors, build) in enumerate(views(cube)):
+            relative_path = os.path.join(page, view_name(selectors)+'.html')
+            labels[relative_path] = (module_name, ', '.join(str(value) for value in selectors))
+            tasks.append((reference, position, selectors, title, out_dir,
+                          manifest.get(relative_path, {}).get('hash'), inline, png))
+
+    # The views of the pages which are not exported this time are kept as they are
+    new_manifest = {relative_path: entry for relative_path, entry in manifest.items()
+                    if entry['page'] not in exported}
+    counts = {'html': 0, 'png': 0}
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(path,)) as executor:
+        for relative_path, digest, written in executor.map(export_view, tasks, chunksize=8):
+            module_name, label = labels[relative_path]
+            new_manifest[relative_path] = {'hash': digest, 'page': module_name, 'label': label}
+            counts['html'] += written['html']
+            counts['png'] += written['png']
+
+    # Remove the files of the views of the exported pages which do not exist anymore (e.g. of a year
+    # without activities now)
+    for relative_path in set(manifest)-set(new_manifest):
+        for file_path in (relative_path, os.path.splitext(relative_path)[0]+'.png'):
+            if os.path.exists(os.path.join(out_dir, file_path)):
+                os.remove(os.path.join(out_dir, file_path))
+
+    with open(manifest_path, 'w') as f:
+        json.dump(new_manifest, f, indent=1, sort_keys=True)
+
+    index = {}
+    for relative_path, entry in new_manifest.items():
+        index.setdefault(entry['page'], []).append((relative_path, entry['label']))
+    write_index(out_dir, index, list(PAGES)+list(pages))
+
+    return len(tasks), counts['html'], counts['png']
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('out_dir', nargs='?', default='export', help='directory of the exported views')
+    parser.add_argument('--pages', nargs='+', help='modules of the pages to export (all by default)')
+    parser.add_argument('--data', default=DATA_PATH, help='csv file of the activities')
+    parser.add_argument('--workers', type=int, help='number of processes (one per CPU by default)')
+    parser.add_argument('--inline', action='store_true',
+                        help='include BokehJS in every file, so they open without internet access')
+    parser.add_argument('--no-png', action='store_true', help='only write the HTML files')
+    args = parser.parse_args(argv)
+
+    pages = [(title, reference) for title, reference in PAGES
+             if not args.pages or reference.split(':')[0] in args.pages]
+
+    start = time.perf_counter()
+    n_views, n_html, n_png = export_all(args.out_dir, pages, args.data, args.workers, args.inline,
+                                        not args.no_png)
+
+    print(str(n_views)+' views exported to '+args.out_dir+' in '+format(time.perf_counter()-start, '.1f')+
+          ' s: '+str(n_html)+' HTML and '+str(n_png)+' PNG files written, '+str(n_views-n_html)+
+          ' unchanged')
+
+# =============================================================================
+
+if __name__ == '__main__':
+    sys.exit(main())
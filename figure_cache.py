@@ -0,0 +1,162 @@
+"""Cache of the figures of the pages, serialized as Bokeh JSON.
+
+The figure of a page only depends on the page, on the values of its selectors and on the data, so it
+is built and serialized once per combination, and the next runs with the same selectors (from any
+session) only send the cached JSON to the browser:
+    show_figure('yearly_statistics', (activity, statistic), lambda: build_figure(cube, activity, statistic))
+
+The cache is a least recently used one, bounded by the size of the JSON it holds (64 MB by default,
+SPORTS_FIGURE_CACHE_MB to change it). The figures of an older version of the data are never served,
+as the version is part of the key, and they end up evicted.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from activity_cube import data_version
+from general_functions import slim_sources
+from instrumentation import stage
+
+# =============================================================================
+
+class FigureCache:
+    """Least recently used cache of serialized figures, bounded by the total size of their JSON.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        # Does not count as a hit or a miss, nor make the figure more recent
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            figure_json = self.entries.get(key)
+            if figure_json is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return figure_json
+
+    def put(self, key, figure_json):
+        size = len(figure_json)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+
+            self.entries[key] = figure_json
+            self.size += size
+
+            # Evict the least recently used figures until the new one fits
+            while self.size > self.max_bytes:
+                evicted_key, evicted_json = self.entries.popitem(last=False)
+                self.size -= len(evicted_json)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self.entries), 'bytes': self.size, 'max_bytes': self.max_bytes}
+
+# Shared by all the sessions of the process
+figure_cache = FigureCache(int(float(os.environ.get('SPORTS_FIGURE_CACHE_MB', 64))*2**20))
+
+# =============================================================================
+
+def serialize_figure(figure):
+
+    # Same serialization as st.bokeh_chart, after dropping the data the figure does not use
+    from bokeh.embed import json_item
+
+    return json.dumps(json_item(slim_sources(figure)))
+
+# =============================================================================
+
+def show_figure_json(figure_json, use_container_width=False):
+    """Shows a figure serialized by serialize_figure, as st.bokeh_chart shows a figure (which would
+    serialize it again). It relies on the internals of streamlit.elements.bokeh_chart (streamlit 1.4).
+    """
+    from streamlit.proto.BokehChart_pb2 import BokehChart as BokehChartProto
+
+    dg = st._main
+
+    proto = BokehChartProto()
+    proto.figure = figure_json
+    proto.use_container_width = use_container_width
+    proto.element_id = hashlib.md5(dg._get_delta_path_str().encode()).hexdigest()
+
+    dg._enqueue('bokeh_chart', proto)
+
+# =============================================================================
+
+def figure_key(page, selectors, version):
+
+    return (page, tuple(selectors), version)
+
+# =============================================================================
+
+def cache_figure(page, selectors, build, version):
+    """Builds and caches the figure of page for the values of its selectors and the version of the
+    data, without showing it, unless it is already cached. Returns True when it was built.
+    """
+    key = figure_key(page, selectors, version)
+    if key in figure_cache:
+        return False
+
+    figure_cache.put(key, serialize_figure(build()))
+    return True
+
+# =============================================================================
+
+def show_figure(page, selectors, build, use_container_width=True, date_range=None):
+    """Shows the figure of page for the values of its selectors (a tuple), calling build to make it
+    only when it is not cached for the current version of the data (and date range of the activities,
+    see date_range).
+    """
+    version = data_version() if date_range is None else (data_version(),)+tuple(date_range)
+    key = figure_key(page, selectors, version)
+
+    with stage('cache'):
+        figure_json = figure_cache.get(key)
+
+    if figure_json is None:
+        figure = build()
+
+        with stage('serialize'):
+            figure_json = serialize_figure(figure)
+        figure_cache.put(key, figure_json)
+
+    with stage('render'):
+        show_figure_json(figure_json, use_container_width)
+
+# =============================================================================
+
+def cache_markdown():
+
+    # Line for the sidebar panel of the timings
+    stats = figure_cache.stats()
+
+    return 'Figure cache: '+str(stats['hits'])+' hits, '+str(stats['misses'])+' misses, '+\
+           str(stats['entries'])+' figures ('+format(stats['bytes']/2**20, '.1f')+' of '+\
+           format(stats['max_bytes']/2**20, '.0f')+' MB)'
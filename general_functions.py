@@ -1,55 +1,189 @@
+import re
+
 import pandas as pd
 import numpy as np
 
-from bokeh.models import ColumnDataSource, LabelSet
+from bokeh.models import ColumnDataSource, HoverTool, LabelSet
 from bokeh.plotting import figure
 
-def create_color_time_spent_columns(activity_df, statistic):
-    
-    # Create a column with the colors of the bars. Green is the smallest, red the biggest and blue
-    # are the others. Create also the time labels
+# Names of the months, used in the x-axis
+MONTH_NAMES = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# Columns named in the tooltips, as @column or @{column}
+TOOLTIP_FIELD = re.compile(r'@\{([^}]+)\}|@(\w+)')
+
+# Tag of the sources whose columns are read by CustomJS callbacks (see client_side), which slim_sources
+# keeps whole
+PRELOADED_TAG = 'preloaded'
+
+# Columns of the activities which are summed when the data is grouped
+METRIC_COLUMNS = ['Distance_km', 'Hours', 'Minutes', 'Seconds', 'Time_h', 'Calories', 'ElevGain_m',
+                  'AvgSpeed_km/h']
+
+# =============================================================================
+
+def filter_mask(df, filters):
     
-    color, time_spent = [], [] # Variable to hold the colors and the time labels
+    # Boolean mask of the rows matching all the filters. The filters are given by column (or index
+    # level) name, with a single value or a list of values
+    mask = np.ones(len(df), dtype=bool)
     
-    for idx in activity_df.index: # Loop over the index
+    for name, value in filters.items():
+        if name in df.index.names:
+            values = df.index.get_level_values(name)
+        else:
+            values = df[name]
         
-        # Make sure the colors of the bars are set according to the statistic chosen
-        if statistic == 'Distance':
-            to_check = activity_df.Distance_km
-        elif statistic == 'Time':
-            to_check = activity_df.Time_h
-        elif statistic == 'Count':
-            to_check = activity_df['count']
-    
-        # Add the color to the list
-        if to_check[idx] == max(to_check):
-            color.append('red')
-        elif to_check[idx] == min(to_check):
-            color.append('green')
+        if isinstance(value, (list, tuple, set, np.ndarray)):
+            mask &= np.asarray(values.isin(list(value)))
         else:
-            color.append('blue')
+            mask &= np.asarray(values == value)
+    
+    return mask
+
+# =============================================================================
+
+def aggregate_statistics(df, by, **filters):
+    
+    # Select the activities once, group them once and take every statistic from that grouping: the sums
+    # of the metrics, the number of speeds available (the average speed is derived from it and from the
+    # sum of the speeds) and the number of activities. The result is additive, so it can be summed
+    # again to a coarser grouping
+    if filters:
+        df = df.loc[filter_mask(df, filters)]
+    
+    grouped = df.groupby(by, observed=True)
+    
+    stats = grouped[METRIC_COLUMNS].sum()
+    stats['speed_count'] = grouped['AvgSpeed_km/h'].count()
+    stats['count'] = grouped.size()
+    
+    # Sorting the index also sorts the levels, which otherwise follow the order in which the activity
+    # types appear
+    return stats.sort_index()
+
+# =============================================================================
+
+def derive_averages(stats):
+    
+    # Turn the additive statistics into the columns used by the plots: the sums of the metrics, the
+    # average speed and the number of activities. The sum of the speeds is not a statistic of its own,
+    # only the average speed is kept
+    activity_df = stats.drop(['speed_count', 'AvgSpeed_km/h'], axis=1)
+    
+    activity_df['avg_speed'] = stats['AvgSpeed_km/h']/stats['speed_count']
+    
+    # The summed durations are carried, so the minutes and the seconds stay below 60
+    seconds = stats['Hours']*3600+stats['Minutes']*60+stats['Seconds']
+    activity_df['Hours'], activity_df['Minutes'], activity_df['Seconds'] = \
+        seconds//3600, seconds//60%60, seconds%60
+    activity_df['count'] = activity_df.pop('count')
+    
+    return activity_df
+
+# =============================================================================
+
+def fill_missing_months(activity_df, groups=None, fill_values=None):
+    
+    # As there are some months in which some of the activities were not done and they should "appear"
+    # in the graphs, it is necessary to create rows for them. The frame is indexed by month, or by
+    # (group, month), in which case every group gets the 12 months in the order given. A group can also
+    # span several levels, e.g. (activity, year) for a frame indexed by (Type, Year, Month). All the rows
+    # are created at once, by reindexing against the full calendar, which also drops the groups which
+    # were not asked for
+    months = np.arange(1, 13)
+    if groups is None:
+        full_index = pd.Index(months, name=activity_df.index.name)
+    else:
+        groups = list(groups)
+        n_group_levels = activity_df.index.nlevels-1
         
-        # Create the time labels
-        hour = int(activity_df.Time_h[idx]) # The integer part is the number of hours spent
+        # One array per level: each group is repeated 12 times and the months are tiled after it
+        if n_group_levels == 1:
+            group_levels = [np.repeat(np.array(groups, dtype=object), 12)]
+        else:
+            group_levels = [np.repeat(np.array([group[i] for group in groups], dtype=object), 12)
+                            for i in range(n_group_levels)]
         
-        # By removing the integer part to the overall value, you get the minutes, which need to be multiplied
-        # by 60 and then rounded to no decimal cases
-        minutes = int(round((activity_df.Time_h[idx]-hour)*60, 0))
+        full_index = pd.MultiIndex.from_arrays(group_levels+[np.tile(months, len(groups))],
+                                               names=activity_df.index.names)
+    
+    filled = activity_df.reindex(full_index)
+    
+    # The rows without activities get 0 in the numeric columns, keeping their type, and None in the
+    # others (colors and labels), unless another value is given for the column
+    fill_values = fill_values or {}
+    for col in filled.columns:
+        if col in fill_values:
+            value = fill_values[col]
+        elif pd.api.types.is_numeric_dtype(activity_df[col]):
+            value = 0
+        else:
+            value = None
         
-        # Format the number of minutes
+        if value is None:
+            filled[col] = filled[col].astype(object).where(filled[col].notna(), None)
+        elif pd.api.types.is_numeric_dtype(activity_df[col]):
+            filled[col] = filled[col].fillna(value).astype(activity_df[col].dtype)
+        else:
+            filled[col] = filled[col].fillna(value)
+    
+    return filled
+
+# =============================================================================
+
+def format_duration(time_h, style='clock'):
+    
+    # Turn durations in hours into labels, either hours:minutes' ('clock', just the hours when there
+    # are no minutes) or "<hours>h <minutes>m" ('hm'). The whole array is converted at once, and the
+    # minutes are always rounded to the nearest one, carrying to the hours when they reach 60
+    total_minutes = np.round(np.atleast_1d(np.asarray(time_h, dtype=float))*60).astype(int)
+    hours, minutes = np.divmod(total_minutes, 60)
+    
+    hours_label = pd.Series(hours).astype(str)
+    minutes_label = pd.Series(minutes).astype(str)
+    
+    if style == 'clock':
         # When the number of minutes is between 1 and 9, add a 0 before it
-        time = None
-        if len(str(minutes)) == 1 and minutes != 0:
-            minutes = '0'+str(minutes)
-            
-        # When the number of minutes is 0, the label is just the hours
-        elif minutes == 0:
-            time = str(hour) 
-        
-        if type(time) != str: # If time is already defined, this step will not be taken
-            time = str(hour)+':'+str(minutes)+'\'' # Create the label
-        
-        time_spent.append(time) # Add the label to the list
+        labels = np.where(minutes == 0, hours_label, hours_label+':'+minutes_label.str.zfill(2)+'\'')
+    elif style == 'hm':
+        labels = (hours_label+'h '+minutes_label+'m').to_numpy()
+    else:
+        raise ValueError("Unknown duration style '"+str(style)+"'")
+    
+    # A single duration gives a single label
+    if np.ndim(time_h) == 0:
+        return labels[0]
+    
+    return labels
+
+# =============================================================================
+
+def create_color_time_spent_columns(activity_df, statistic):
+    
+    # Create a column with the colors of the bars. Green is the smallest, red the biggest and blue
+    # are the others. Create also the time labels
+    
+    # Make sure the colors of the bars are set according to the statistic chosen
+    if statistic == 'Distance':
+        to_check = activity_df.Distance_km.to_numpy()
+    elif statistic == 'Time':
+        to_check = activity_df.Time_h.to_numpy()
+    elif statistic == 'Count':
+        to_check = activity_df['count'].to_numpy()
+
+    # Without any bar (e.g. a year without activities of the type) there is no maximum nor minimum
+    if len(to_check) == 0:
+        activity_df['color'] = pd.Series(dtype=object)
+        activity_df['time_spent'] = pd.Series(dtype=object)
+        return
+
+    # The maximum and the minimum are computed once and every bar is compared against them
+    color = np.where(to_check == to_check.max(), 'red',
+                     np.where(to_check == to_check.min(), 'green', 'blue'))
+    
+    # Create the time labels
+    time_spent = format_duration(activity_df.Time_h)
 
     # Add the columns to the dataframe
     activity_df['color'] = color
@@ -91,6 +225,68 @@ def visuals_standardization(fig):
 
 # =============================================================================
 
+def referenced_columns(fig):
+    
+    # Names of the columns which the models of the figure use: the fields of the glyphs, labels, legends
+    # and transforms (e.g. the cumsum of the pie), and the columns named in the tooltips
+    names = set()
+    
+    def collect(value):
+        if isinstance(value, dict):
+            if isinstance(value.get('field'), str):
+                names.add(value['field'])
+            if isinstance(value.get('fields'), list):
+                names.update(field for field in value['fields'] if isinstance(field, str))
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                collect(item)
+    
+    for model in fig.references():
+        if isinstance(model, ColumnDataSource):
+            continue
+        
+        collect(model.to_json(include_defaults=True))
+        
+        if isinstance(model, HoverTool) and isinstance(model.tooltips, list):
+            for label, text in model.tooltips:
+                names.update(braced or plain for braced, plain in TOOLTIP_FIELD.findall(text))
+    
+    return names
+
+# =============================================================================
+
+def slim_sources(fig):
+    
+    # Only the columns used by the figure are sent to the browser, and the numbers as 32 bits typed
+    # arrays, which Bokeh encodes in binary instead of as lists
+    used = referenced_columns(fig)
+    
+    for source in fig.select({'type': ColumnDataSource}):
+        preloaded = PRELOADED_TAG in source.tags
+        
+        data = {}
+        for name, values in source.data.items():
+            if name not in used and not preloaded:
+                continue
+            
+            if isinstance(values, np.ndarray):
+                if values.dtype.kind == 'f':
+                    values = values.astype('float32')
+                elif values.dtype.kind in 'iu' and (not len(values) or
+                                                    np.iinfo('int32').min <= values.min() and
+                                                    values.max() <= np.iinfo('int32').max):
+                    values = values.astype('int32')
+            
+            data[name] = values
+        
+        source.data = data
+    
+    return fig
+
+# =============================================================================
+
 def title_label_plot(period, activity, statistic, activity_df, year=None):
     
     # Set the source as the curated dataframe
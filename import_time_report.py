@@ -0,0 +1,103 @@
+"""Import-time report of the dashboard, to keep track of the cold start of the workers.
+
+Every module is imported in a fresh interpreter with "python -X importtime", and the report shows the
+cumulative import time of the module and of its heaviest dependencies.
+Usage:
+    python import_time_report.py [--top N] [--csv report.csv] [module ...]
+By default, the entry point's own modules and every page of page_registry.PAGES are measured.
+"""
+import argparse
+import csv
+import subprocess
+import sys
+
+from page_registry import PAGES
+
+# Modules needed before the sidebar is shown
+ENTRY_MODULES = ['multiapp', 'page_registry']
+
+# =============================================================================
+
+def measure_imports(module):
+    """Imports module in a new interpreter and returns the import times it reported, as a list of
+    (imported module, self time in us, cumulative time in us, nesting level).
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import '+module],
+                            stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True)
+
+    if result.returncode != 0:
+        raise RuntimeError('Could not import '+module+':\n'+result.stderr)
+
+    timings = []
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       123 |        456 |     package.module"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+
+        # The nesting of the imports is given by the indentation of the name: 1 space for the imports
+        # done by the interpreter itself, then 2 more per level
+        level = (len(name)-len(name.lstrip())-1)//2
+        timings.append((name.strip(), int(self_us), int(cumulative_us), level))
+
+    return timings
+
+# =============================================================================
+
+def module_report(module, top=5):
+
+    timings = measure_imports(module)
+
+    # The module is reported after all the modules it imported, so its dependencies are the lines right
+    # before it, up to the previous top-level import
+    position = max(i for i, (name, self_us, cumulative, level) in enumerate(timings)
+                   if name == module and level == 0)
+    total = timings[position][2]
+
+    dependencies = []
+    for name, self_us, cumulative, level in reversed(timings[:position]):
+        if level == 0:
+            break
+        if level == 1:
+            dependencies.append((cumulative, name))
+
+    # Heaviest direct dependencies of the module, by cumulative time
+    heaviest = sorted(dependencies, reverse=True)[:top]
+
+    return total, [(name, cumulative) for cumulative, name in heaviest]
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', help='modules to measure (all the pages by default)')
+    parser.add_argument('--top', type=int, default=5, help='number of dependencies shown per module')
+    parser.add_argument('--csv', help='also write the report to this csv file')
+    args = parser.parse_args(argv)
+
+    modules = args.modules or ENTRY_MODULES+[page.split(':')[0] for title, page in PAGES]
+
+    rows = []
+    for module in modules:
+        total, heaviest = module_report(module, args.top)
+
+        print(module+': '+format(total/1000, '.1f')+' ms')
+        for name, cumulative in heaviest:
+            print('    '+name+': '+format(cumulative/1000, '.1f')+' ms')
+
+        rows.append({'module': module, 'cumulative_ms': round(total/1000, 1),
+                     'heaviest': '; '.join(name+'='+format(cumulative/1000, '.1f')
+                                           for name, cumulative in heaviest)})
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['module', 'cumulative_ms', 'heaviest'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+# =============================================================================
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Timing of the stages of the pages.
+
+MultiApp.run opens a trace for the selected page, and the pages mark their stages with the stage
+context manager:
+    with stage('aggregate'):
+        activity_df = rollup(cube, 'Year', Type=activity)
+Outside of a trace (scripts, notebooks), stage does nothing but read the clock.
+
+Every finished trace is logged as a JSON line on the "sports.render" logger and, when the
+SPORTS_TRACE_CSV environment variable is set, appended to that csv file (one row per stage).
+"""
+import contextlib
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('sports.render')
+
+# Each session runs its script in its own thread, so the open trace is kept per thread
+_local = threading.local()
+
+# Serializes the writes to the csv trace
+_csv_lock = threading.Lock()
+
+CSV_FIELDS = ['timestamp', 'page', 'selectors', 'stage', 'ms']
+
+# =============================================================================
+
+class RenderTrace:
+    """Durations of the stages of one run of a page.
+    """
+    def __init__(self, page):
+        self.page = page
+        self.selectors = {}
+        self.stages = []
+        self.timestamp = time.time()
+        self.total = None
+
+    def add(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def as_dict(self):
+        # The stages as [name, ms] pairs in the order they ran, as a page can open the same stage more
+        # than once (e.g. an aggregate before the labels and another one after)
+        return {'page': self.page, 'selectors': self.selectors,
+                'stages': [[name, round(seconds*1000, 3)] for name, seconds in self.stages],
+                'total_ms': round((self.total or 0)*1000, 3)}
+
+# =============================================================================
+
+def current_trace():
+
+    return getattr(_local, 'trace', None)
+
+# =============================================================================
+
+@contextlib.contextmanager
+def stage(name):
+    """Measures the block as the stage name of the current trace.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = current_trace()
+        if trace is not None:
+            trace.add(name, time.perf_counter()-start)
+
+# =============================================================================
+
+def trace_selectors(**selectors):
+
+    # Keep the values chosen in the widgets, to know which combination was slow
+    trace = current_trace()
+    if trace is not None:
+        trace.selectors.update({key: str(value) for key, value in selectors.items()})
+
+# =============================================================================
+
+@contextlib.contextmanager
+def trace_page(page):
+    """Opens the trace of a run of page, and emits it when the run ends.
+    """
+    trace = RenderTrace(page)
+    _local.trace = trace
+
+    start = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        trace.total = time.perf_counter()-start
+        _local.trace = None
+        emit(trace)
+
+# =============================================================================
+
+def emit(trace):
+
+    logger.info(json.dumps(trace.as_dict()))
+
+    path = os.environ.get('SPORTS_TRACE_CSV')
+    if not path:
+        return
+
+    rows = [{'timestamp': trace.timestamp, 'page': trace.page, 'selectors': json.dumps(trace.selectors),
+             'stage': name, 'ms': round(seconds*1000, 3)}
+            for name, seconds in trace.stages+[('total', trace.total)]]
+
+    with _csv_lock:
+        new_file = not os.path.exists(path)
+        with open(path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+# =============================================================================
+
+def timings_markdown(trace):
+
+    # Table for the sidebar panel
+    lines = ['| Stage | ms |', '| --- | ---: |']
+    lines += ['| '+name+' | '+format(seconds*1000, '.1f')+' |' for name, seconds in trace.stages]
+    lines.append('| **total** | **'+format(trace.total*1000, '.1f')+'** |')
+
+    return '\n'.join(lines)
@@ -1,7 +1,11 @@
 """Frameworks for running multiple Streamlit applications as a single app.
 """
+import importlib
+
 import streamlit as st
 
+from instrumentation import stage, timings_markdown, trace_page
+
 class MultiApp:
     """Framework for combining multiple streamlit applications.
     Usage:
@@ -20,6 +24,13 @@ class MultiApp:
         app.add_app("Foo", foo.app)
         app.add_app("Bar", bar.app)
         app.run()
+    The applications in separate files can also be given lazily, as "module:function". The module is
+    only imported when its application is selected for the first time, so the sidebar shows up without
+    importing every page.
+        app = MultiApp()
+        app.add_app("Foo", "foo:app")
+        app.add_app("Bar", "bar:app")
+        app.run()
     """
     def __init__(self):
         self.apps = []
@@ -29,7 +40,7 @@ class MultiApp:
         Parameters
         ----------
         func:
-            the python function to render this app.
+            the python function to render this app, or a "module:function" reference to it.
         title:
             title of the app. Appears in the dropdown in the sidebar.
         """
@@ -38,10 +49,36 @@ class MultiApp:
             "function": func
         })
 
+    def resolve(self, app):
+        """Returns the function of an application, importing its module if it was given lazily.
+        """
+        func = app['function']
+        if isinstance(func, str):
+            module_name, func_name = func.split(':')
+            func = getattr(importlib.import_module(module_name), func_name)
+
+            # Later runs go straight to the function
+            app['function'] = func
+
+        return func
+
     def run(self):
         app = st.sidebar.radio(
             'Go To',
             self.apps,
             format_func=lambda app: app['title'])
 
-        app['function']()
\ No newline at end of file
+        show_timings = st.sidebar.checkbox('Show render timings')
+
+        # Time the stages of the page (the pages mark them with instrumentation.stage)
+        with trace_page(app['title']) as trace:
+            with stage('import'):
+                func = self.resolve(app)
+            func()
+
+        if show_timings:
+            st.sidebar.markdown(timings_markdown(trace))
+
+            # The figure cache brings Bokeh, Pandas and the cube, which the sidebar does not need
+            from figure_cache import cache_markdown
+            st.sidebar.markdown(cache_markdown())
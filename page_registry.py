@@ -0,0 +1,20 @@
+"""Pages of the dashboard, as (title, "module:function") references.
+
+The references are resolved by MultiApp only when a page is selected, so importing this module is
+cheap and it can be used by the tools which go through every page.
+
+The module of a page can also have a <function>_views(cube) generator, which yields the (page key,
+selectors, builder) of every figure the page can show, for the warm-up of the cache (see warmup.py).
+"""
+
+PAGES = [
+    ('Division of Time Spent', 'time_spent:time_spent_moving_per_year'),
+    ('Evolution of Time Spent', 'evolution_of_time_spent_exercising:evolution_of_time_spent_exercising'),
+    ('Last 3 Years Performance', 'last_3_years_performance:last_3_years_performance'),
+    ('Monthly Statistics', 'monthly_statistics:monthly_statistics'),
+    ('Several Years - One Activity Comparison', 'seasons_comparison:seasons_comparison'),
+    ('Two Activities - One Year Comparison',
+     'two_activities_one_year_comparison:two_activities_one_year_comparison'),
+    ('Two Years - One Activity  Comparison', 'yearly_comparison:yearly_comparison'),
+    ('Yearly Statistics', 'yearly_statistics:yearly_statistics'),
+]
@@ -0,0 +1,224 @@
+"""Curated frames of the views of the dashboard, without Streamlit nor Bokeh.
+
+The pages build their figures from these frames, and scripts, notebooks or scheduled jobs can ask for
+the same numbers directly:
+    from activity_cube import load_cube
+    from queries import yearly_stats, comparison
+    cube = load_cube('rwc.csv')
+    yearly_stats(cube, 'Running')
+    comparison(cube, [('Running', 2021), ('Running', 2022)])
+
+Batches of queries can also be answered from the command line, with the activities loaded once for
+all of them:
+    python queries.py queries.jsonl [--data rwc.csv] [--format json|csv] [--output answers.json]
+Each line of the file (or item of a JSON list) is a query, the name of the view and its arguments:
+    {"view": "monthly", "activity": "Running", "year": 2022}
+    {"view": "comparison", "series": [["Running", 2021], ["Cycling", 2021]]}
+The JSON answer has one line per query with its rows (or its error), the csv one row per row of every
+answer, with the number of the query in the first column.
+"""
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from activity_cube import activities, load_cube, rollup, years
+from data_loader import DATA_PATH
+from general_functions import fill_missing_months
+
+# Decimals of the numbers of the answers, the sums of the metrics carry rounding noise beyond them
+DECIMALS = 6
+
+# =============================================================================
+
+def yearly_stats(cube, activity):
+
+    # Statistics of an activity per year. The distances are rounded to 2 decimal cases, and to 0 for
+    # cycling, the average speed to 2
+    activity_df = rollup(cube, 'Year', Type=activity)
+
+    activity_df.Distance_km = activity_df.Distance_km.round(2 if activity != 'Cycling' else 0)
+    activity_df['avg_speed'] = activity_df['avg_speed'].round(2)
+
+    return activity_df
+
+# =============================================================================
+
+def monthly_stats(cube, activity, year, fill_months=True):
+
+    # Statistics of an activity per month of a year, with rows of zeros for the months without
+    # activities unless fill_months is False
+    activity_df = rollup(cube, 'Month', Type=activity, Year=year)
+
+    activity_df.Distance_km = activity_df.Distance_km.round(2)
+    activity_df['avg_speed'] = activity_df['avg_speed'].round(2)
+
+    return fill_missing_months(activity_df) if fill_months else activity_df
+
+# =============================================================================
+
+def time_share(cube, year):
+
+    # Statistics of every activity of a year, from the one with the least time to the one with the
+    # most, with the share of the time of the year spent in each one (between 0 and 1)
+    year_df = rollup(cube, 'Type', Year=year).sort_values(by='Time_h')
+
+    year_df['time_percentage'] = year_df.Time_h/year_df.Time_h.sum()
+
+    return year_df
+
+# =============================================================================
+
+def evolution(cube):
+
+    # Statistics of every activity per year, with the share of the time of the year spent in it (in %)
+    activity_df = rollup(cube, ['Type', 'Year']).drop(['Hours', 'Minutes', 'Seconds'], axis=1)
+
+    activity_df.Distance_km = activity_df.Distance_km.round(2)
+    activity_df['avg_speed'] = activity_df['avg_speed'].round(2)
+
+    activity_df['share'] = activity_df.Time_h/activity_df.groupby(level='Year').Time_h.transform('sum')*100
+
+    return activity_df
+
+# =============================================================================
+
+def comparison(cube, series):
+    """Statistics of the 12 months of every (activity, year) in series, in that order, with rows of
+    zeros for the months without activities. It is the frame of the comparison pages, for any number
+    of series.
+    """
+    series = [(activity, int(year)) for activity, year in series]
+
+    # Sum the cells of all the series at once, then reindex against the months of the requested series,
+    # which also leaves out the (activity, year) pairs of the selection which were not asked for
+    activity_df = rollup(cube, ['Type', 'Year', 'Month'],
+                         Type=sorted({activity for activity, year in series}),
+                         Year=sorted({year for activity, year in series}))
+
+    activity_df.Distance_km = activity_df.Distance_km.round(2)
+    activity_df['avg_speed'] = activity_df['avg_speed'].round(2)
+
+    return fill_missing_months(activity_df, series)
+
+# =============================================================================
+
+# Views which can be queried, by name
+VIEWS = {'yearly': yearly_stats, 'monthly': monthly_stats, 'time_share': time_share,
+         'evolution': evolution, 'comparison': comparison,
+         'activities': lambda cube, year=None: pd.DataFrame({'Type': activities(cube, year)}),
+         'years': lambda cube, activity=None: pd.DataFrame({'Year': years(cube, activity)})}
+
+# =============================================================================
+
+def run_query(cube, query):
+
+    # Frame answering a query, {"view": name, **arguments}, with its index as columns
+    arguments = dict(query)
+    view = arguments.pop('view', None)
+    if view not in VIEWS:
+        raise KeyError('Unknown view: '+str(view)+' (one of '+', '.join(VIEWS)+')')
+
+    frame = VIEWS[view](cube, **arguments)
+
+    # Only the frames with a meaningful index (not a plain range) keep it
+    if frame.index.names != [None]:
+        frame = frame.reset_index()
+
+    # The categorical activity types are written as their names
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(str)
+
+    return frame.round(DECIMALS)
+
+# =============================================================================
+
+def read_queries(f):
+
+    # A JSON list of queries, or one query per line
+    text = f.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+# =============================================================================
+
+def answer_queries(cube, queries):
+    """Answers the queries, yielding (query, frame or None, error or None). The same query asked again
+    is answered from the first answer.
+    """
+    answers = {}
+    for query in queries:
+        key = json.dumps(query, sort_keys=True)
+        if key not in answers:
+            try:
+                answers[key] = (run_query(cube, query), None)
+            except (KeyError, TypeError, ValueError) as error:
+                answers[key] = (None, error.__class__.__name__+': '+str(error))
+
+        frame, error = answers[key]
+        yield query, frame, error
+
+# =============================================================================
+
+def write_json(answers, out):
+
+    # One line per query, with the rows of its frame or its error
+    for query, frame, error in answers:
+        if error is None:
+            out.write('{"query": '+json.dumps(query)+', "rows": '+frame.to_json(orient='records')+'}\n')
+        else:
+            out.write(json.dumps({'query': query, 'error': error})+'\n')
+
+# =============================================================================
+
+def write_csv(answers, out):
+
+    # All the rows in one table, the columns of the views which do not have them are left empty, and the
+    # errors go to the standard error
+    frames = []
+    for number, (query, frame, error) in enumerate(answers):
+        if error is None:
+            # The integers stay integers next to the empty cells
+            frame = frame.astype({col: 'Int64' for col in frame.columns
+                                  if pd.api.types.is_integer_dtype(frame[col])})
+            frames.append(frame.assign(query=number, view=query['view'])[['query', 'view']+list(frame.columns)])
+        else:
+            sys.stderr.write('Query '+str(number)+' '+json.dumps(query)+' failed: '+error+'\n')
+
+    if frames:
+        pd.concat(frames, ignore_index=True).to_csv(out, index=False)
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('queries', nargs='?', default='-', help='file of the queries (- for the standard input)')
+    parser.add_argument('--data', default=DATA_PATH, help='csv file of the activities')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json', help='format of the answers')
+    parser.add_argument('--output', default='-', help='file of the answers (- for the standard output)')
+    args = parser.parse_args(argv)
+
+    if args.queries == '-':
+        queries = read_queries(sys.stdin)
+    else:
+        with open(args.queries) as f:
+            queries = read_queries(f)
+
+    cube = load_cube(args.data)
+    write = write_json if args.format == 'json' else write_csv
+
+    if args.output == '-':
+        write(answer_queries(cube, queries), sys.stdout)
+    else:
+        with open(args.output, 'w', newline='') as out:
+            write(answer_queries(cube, queries), out)
+
+# =============================================================================
+
+if __name__ == '__main__':
+    sys.exit(main())
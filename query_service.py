@@ -0,0 +1,356 @@
+"""Local HTTP service answering the queries of queries.py with JSON, for the other dashboards.
+
+The endpoints are the views of queries.VIEWS, with their arguments in the query string:
+    GET /yearly?activity=Running
+    GET /monthly?activity=Running&year=2022
+    GET /comparison?series=Running:2021,Cycling:2021
+    GET /views      (the names of the views)
+    GET /health     (the version of the data)
+and the answers are the frames the pages plot, so the service and the dashboard always agree:
+    {"view": "yearly", "query": {...}, "version": "...", "rows": [{"Year": 2015, ...}, ...]}
+Run it with:
+    python query_service.py [--host 127.0.0.1] [--port 8765] [--data rwc.csv]
+
+It is a single asyncio loop using only the standard library. The activities are loaded and reloaded
+by a background thread, so a request never waits for the csv to be parsed (except the very first
+ones, before there is any data): while a new version loads, the previous one is served. The answers
+are kept in a least recently used cache of their own (see ResponseCache) keyed on the query and the
+version of the data, and carry an ETag, so a client asking again with If-None-Match gets a 304 without
+any work. The arguments are checked before any work too: unknown or missing ones, years which are not
+numbers or out of the years of the data and unknown activities get a 400.
+"""
+import argparse
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+from activity_cube import activities, data_version, load_cube, years
+from data_loader import DATA_PATH
+from queries import VIEWS, run_query
+
+logger = logging.getLogger('sports.service')
+
+# Seconds between two checks for a new version of the data
+REFRESH_INTERVAL = 5
+
+# Bytes of answers kept in the cache
+CACHE_BYTES = 32*2**20
+
+# Seconds a request waits for the first version of the data before giving up
+LOAD_TIMEOUT = 60
+
+# Longest request head accepted
+MAX_HEAD = 16384
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+# =============================================================================
+
+# Values of fill_months
+BOOLEANS = {'1': True, 'true': True, '0': False, 'false': False}
+
+# =============================================================================
+
+def view_parameters(view):
+
+    # Arguments of a view, by name, with True for the required ones
+    parameters = list(inspect.signature(VIEWS[view]).parameters.values())[1:]
+
+    return {parameter.name: parameter.default is inspect.Parameter.empty for parameter in parameters}
+
+# =============================================================================
+
+def parse_year(value, known_years):
+
+    # A year of the data, or between its first and its last years (some years may have no activities)
+    try:
+        year = int(value)
+    except ValueError:
+        raise ValueError('year must be an integer, got '+repr(value)) from None
+
+    if known_years and not known_years[0] <= year <= known_years[-1]:
+        raise ValueError('year must be between '+str(known_years[0])+' and '+str(known_years[-1])+
+                         ', got '+str(year))
+
+    return year
+
+# =============================================================================
+
+def parse_activity(value, known_activities):
+
+    if value not in known_activities:
+        raise ValueError('Unknown activity '+repr(value)+' (one of '+', '.join(known_activities)+')')
+
+    return value
+
+# =============================================================================
+
+def parse_query(view, pairs, cube):
+    """Arguments of a view from the query string, checked against the arguments of the view and the
+    activities and years of cube. The series of the comparison are "activity:year" separated by
+    commas. Raises ValueError for any argument which is unknown, repeated, missing or out of range.
+    """
+    parameters = view_parameters(view)
+    known_activities, known_years = activities(cube), years(cube)
+
+    query = {'view': view}
+    for key, value in pairs:
+        if key not in parameters:
+            raise ValueError('Unknown argument '+repr(key)+' of '+view+
+                             (' (one of '+', '.join(parameters)+')' if parameters else ', which takes none'))
+        if key in query:
+            raise ValueError('Repeated argument '+repr(key))
+
+        if key == 'series':
+            query[key] = []
+            for item in value.split(','):
+                activity, separator, year = item.rpartition(':')
+                if not separator:
+                    raise ValueError('series must be activity:year, got '+repr(item))
+                query[key].append([parse_activity(activity, known_activities), parse_year(year, known_years)])
+        elif key == 'year':
+            query[key] = parse_year(value, known_years)
+        elif key == 'activity':
+            query[key] = parse_activity(value, known_activities)
+        elif key == 'fill_months':
+            if value.lower() not in BOOLEANS:
+                raise ValueError('fill_months must be one of '+', '.join(BOOLEANS)+', got '+repr(value))
+            query[key] = BOOLEANS[value.lower()]
+        else:
+            query[key] = value
+
+    missing = [name for name, required in parameters.items() if required and name not in query]
+    if missing:
+        raise ValueError('Missing argument '+', '.join(missing)+' of '+view)
+
+    return query
+
+# =============================================================================
+
+class ResponseCache:
+    """Least recently used cache of the bodies of the answers, bounded by their total size.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+
+            self.entries[key] = body
+            self.size += len(body)
+
+            # Evict the least recently used answers until the new one fits
+            while self.size > self.max_bytes:
+                self.size -= len(self.entries.popitem(last=False)[1])
+
+# =============================================================================
+
+class QueryService:
+    """The data, the cache of the answers and the handling of the connections.
+    """
+    def __init__(self, path=DATA_PATH, cache_bytes=CACHE_BYTES, refresh_interval=REFRESH_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.cache = ResponseCache(cache_bytes)
+
+        # (version, cube) of the data being served, set by refresh
+        self.current = None
+        self.loaded = None
+
+    # Data --------------------------------------------------------------------
+
+    def load(self):
+        # Runs in a thread: parsing the csv never blocks the loop
+        cube = load_cube(self.path)
+        return data_version(self.path), cube
+
+    async def refresh(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                current = await loop.run_in_executor(None, self.load)
+                if self.current is None or current[0] != self.current[0]:
+                    logger.info('Serving version %s', current[0])
+                self.current = current
+                self.loaded.set()
+            except Exception:
+                logger.warning('Loading %s failed', self.path, exc_info=True)
+
+            await asyncio.sleep(self.refresh_interval)
+
+    async def data(self):
+        # Only the first requests wait, until the first version is loaded. None when it does not load
+        if self.current is None:
+            try:
+                await asyncio.wait_for(self.loaded.wait(), LOAD_TIMEOUT)
+            except asyncio.TimeoutError:
+                return None
+        return self.current
+
+    # Answers -----------------------------------------------------------------
+
+    async def answer(self, target, headers):
+        """Status, body and extra headers of the answer to a GET of target.
+        """
+        url = urlsplit(target)
+        view = url.path.strip('/')
+
+        if view == 'views':
+            return 200, json.dumps(sorted(VIEWS)), {}
+
+        current = await self.data()
+        if current is None:
+            return 503, json.dumps({'error': 'The activities could not be loaded'}), {}
+
+        version, cube = current
+
+        if view == 'health':
+            return 200, json.dumps({'status': 'ok', 'version': str(version)}), {}
+
+        if view not in VIEWS:
+            return 404, json.dumps({'error': 'Unknown view: '+view}), {}
+
+        try:
+            query = parse_query(view, parse_qsl(url.query, keep_blank_values=True), cube)
+        except ValueError as error:
+            return 400, json.dumps({'error': str(error)}), {}
+
+        key = json.dumps(query, sort_keys=True)
+        etag = '"'+hashlib.sha1((key+str(version)).encode()).hexdigest()+'"'
+        extra = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        # The answer to a query does not change while the version does not
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, '', extra
+
+        body = self.cache.get((key, version))
+        if body is None:
+            loop = asyncio.get_running_loop()
+            try:
+                frame = await loop.run_in_executor(None, run_query, cube, query)
+            except (KeyError, TypeError, ValueError) as error:
+                return 400, json.dumps({'error': error.__class__.__name__+': '+str(error)}), {}
+
+            body = '{"view": '+json.dumps(view)+', "query": '+key+', "version": '+json.dumps(str(version))+\
+                   ', "rows": '+frame.to_json(orient='records')+'}'
+            self.cache.put((key, version), body)
+
+        return 200, body, extra
+
+    # Connections -------------------------------------------------------------
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1, with the connection kept open between requests unless the client closes it
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, protocol = lines[0].split(' ')
+                except ValueError:
+                    await self.respond(writer, 400, json.dumps({'error': 'Bad request line'}), {}, False)
+                    return
+
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and protocol == 'HTTP/1.1'
+
+                start = time.perf_counter()
+                if method not in ('GET', 'HEAD'):
+                    status, body, extra = 405, json.dumps({'error': 'Only GET is supported'}), {}
+                else:
+                    try:
+                        status, body, extra = await self.answer(target, headers)
+                    except Exception:
+                        logger.exception('%s %s failed', method, target)
+                        status, body, extra = 500, json.dumps({'error': 'Internal error'}), {}
+
+                await self.respond(writer, status, body, extra, keep_alive, method == 'HEAD')
+                logger.debug('%s %s %d %.1f ms', method, target, status, (time.perf_counter()-start)*1000)
+
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, body, extra, keep_alive, head_only=False):
+        # The answer to a HEAD has the headers of the answer to the GET, its length included, without
+        # its body
+        data = body.encode()
+        head = ['HTTP/1.1 '+str(status)+' '+REASONS[status],
+                'Content-Type: application/json',
+                'Content-Length: '+str(len(data)),
+                'Connection: '+('keep-alive' if keep_alive else 'close')]
+        head += [name+': '+value for name, value in extra.items()]
+
+        writer.write(('\r\n'.join(head)+'\r\n\r\n').encode('latin-1')+(b'' if head_only else data))
+        await writer.drain()
+
+    # Server ------------------------------------------------------------------
+
+    async def serve(self, host, port):
+        self.loaded = asyncio.Event()
+        refresh = asyncio.ensure_future(self.refresh())
+
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD)
+        logger.info('Serving %s on http://%s:%d', self.path, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            refresh.cancel()
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='port to listen on')
+    parser.add_argument('--data', default=DATA_PATH, help='csv file of the activities')
+    parser.add_argument('--cache-mb', type=float, default=CACHE_BYTES/2**20, help='size of the cache of the answers')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+
+    service = QueryService(args.data, int(args.cache_mb*2**20))
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+# =============================================================================
+
+if __name__ == '__main__':
+    sys.exit(main())
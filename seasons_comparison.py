@@ -0,0 +1,85 @@
+import streamlit as st
+
+from functools import partial
+
+from activity_cube import activities, years
+from client_side import STATISTICS, client_side_mode, statistic_switch
+from comparison import activity_titles, comparison_figure, comparison_frame
+from date_range import page_cube
+from figure_cache import show_figure
+from instrumentation import stage, trace_selectors
+
+def seasons_comparison():
+    
+    # Page title
+    st.markdown("<h1 style='text-align: center;'>Several Years - One Activity Comparison</h1>", unsafe_allow_html=True)
+    
+    # Load the aggregates of the activities of the dates chosen in the sidebar
+    with stage('load'):
+        cube, date_range = page_cube()
+    
+    if cube is None:
+        return
+    
+    # The statistic can also be switched in the browser
+    client_side = client_side_mode()
+    
+    col_1, col_2 = st.columns(2)
+    
+    # Variables to select the activity and the statistic
+    activity = col_1.selectbox('Activity:', activities(cube))
+    statistic = None if client_side else col_2.selectbox('Statistic:', STATISTICS)
+    
+    # Restrict the set of available years based on the chosen activity. By default, the last 5 seasons
+    # are compared
+    year_options = years(cube, activity)
+    chosen_years = st.multiselect('Years:', year_options, default=year_options[-5:])
+    
+    if not chosen_years:
+        st.warning('Choose at least one year to compare.')
+        return
+    
+    chosen_years = sorted(chosen_years)
+    trace_selectors(activity=activity, statistic=statistic, years=chosen_years)
+    
+    # Show the figure, which is only built when it is not cached
+    if client_side:
+        show_figure('seasons_comparison', (activity, statistic, tuple(chosen_years)), lambda: statistic_switch(
+            lambda statistic: seasons_comparison_figure(cube, activity, statistic, chosen_years)),
+            date_range=date_range)
+    else:
+        show_figure('seasons_comparison', (activity, statistic, tuple(chosen_years)),
+                    lambda: seasons_comparison_figure(cube, activity, statistic, chosen_years),
+                    date_range=date_range)
+
+def seasons_comparison_views(cube):
+    
+    # Every activity and statistic, with the default years only, the subsets of the years being too many
+    for activity in activities(cube):
+        chosen_years = sorted(years(cube, activity)[-5:])
+        for statistic in STATISTICS:
+            yield ('seasons_comparison', (activity, statistic, tuple(chosen_years)),
+                   partial(seasons_comparison_figure, cube, activity, statistic, chosen_years))
+
+def seasons_comparison_figure(cube, activity, statistic, chosen_years):
+        
+    ##############################################################################################
+    # Data selection and curation
+    ##############################################################################################
+    
+    # The 12 months of every chosen year, each one with its own color
+    df_to_plot = comparison_frame(cube, [(activity, year) for year in chosen_years])
+    
+    #####################################################################################################
+    # Plotting
+    #####################################################################################################
+    
+    # Set the title and the y-axis label
+    title, label, counter_name = activity_titles(activity, statistic, 'Comparison of the ')
+    if len(chosen_years) == 1:
+        title_ending = 'in '+str(chosen_years[0])
+    else:
+        title_ending = 'between '+', '.join(str(year) for year in chosen_years[:-1])+' and '+\
+                       str(chosen_years[-1])
+    
+    return comparison_figure(df_to_plot, statistic, title, title_ending, label, counter_name)
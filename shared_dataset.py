@@ -0,0 +1,141 @@
+"""Activities shared by all the worker processes of a deployment, in memory-mapped files.
+
+One loader process parses the csv and publishes its columns (the codes for the activity type) as .npy
+files in a shared directory, by default in /dev/shm, so they live in RAM. Every worker maps the same
+files read-only, so the activities take the memory of one copy whatever the number of workers:
+    python shared_dataset.py publish [path/to/activities.csv] [--watch SECONDS]
+    SPORTS_BACKEND=shared streamlit run sports_visualization.py
+
+Every publication goes to a new version directory, and the CURRENT file, replaced atomically, names
+the one to use. The workers which still map an older version keep reading it, and switch when they
+see the new name; the old versions are removed by the publisher (their files stay readable until the
+last worker unmaps them).
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from data_loader import (DATA_PATH, file_signature, read_columnar_cache, read_csv_activities,
+                         write_columnar_cache)
+
+# Directory of the published versions, in RAM when the system has a /dev/shm
+SHARED_ROOT = os.environ.get('SPORTS_SHARED_ROOT',
+                             '/dev/shm/sports' if os.path.isdir('/dev/shm') else
+                             os.path.join(tempfile.gettempdir(), 'sports_shared'))
+
+# Versions kept on disk by the publisher, the current one and the previous one which some workers may
+# still be switching from
+KEEP_VERSIONS = 2
+
+# =============================================================================
+
+def current_version(root=SHARED_ROOT):
+
+    # Name and metadata of the version to use, None when nothing was published yet
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# =============================================================================
+
+def publish(path=DATA_PATH, root=SHARED_ROOT, keep=KEEP_VERSIONS):
+    """Parses the csv path and publishes its columns as a new version, then removes the oldest ones.
+    Returns the name of the new version.
+    """
+    os.makedirs(root, exist_ok=True)
+
+    signature = file_signature(path)
+    version = 'v'+str(time.time_ns())+'_'+str(os.getpid())
+
+    # A version is a columnar cache (see data_loader), written aside and then renamed
+    write_columnar_cache(read_csv_activities(path), os.path.join(root, version), signature)
+
+    # Swap the pointer to the current version
+    fd, tmp_path = tempfile.mkstemp(dir=root, prefix='.tmp_current_')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'version': version, 'source': os.path.abspath(path), 'signature': list(signature)}, f)
+    os.replace(tmp_path, os.path.join(root, 'CURRENT'))
+
+    # The names start with the publication time, so they sort by age
+    versions = sorted(name for name in os.listdir(root) if name.startswith('v'))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    return version
+
+# =============================================================================
+
+class SharedDataset:
+    """Read-only view of a published version: every column is a memory-mapped NumPy array, shared with
+    the other processes which attached to the same version.
+    """
+    def __init__(self, root, version):
+        self.root = root
+        self.version = version
+        self.directory = os.path.join(root, version)
+
+        with open(os.path.join(self.directory, 'meta.json')) as f:
+            meta = json.load(f)
+
+        self.categories = meta['categories']
+        self.columns = {col['name']: np.load(os.path.join(self.directory, col['file']), mmap_mode='r')
+                        for col in meta['columns']}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def is_current(self):
+        current = current_version(self.root)
+        return current is not None and current['version'] == self.version
+
+    def frame(self):
+        """The activities as a DataFrame. Pandas groups the columns in blocks, which copies them, so
+        this is for the code which really needs a frame; the cube is built from the columns directly.
+        """
+        return read_columnar_cache(self.directory)
+
+# =============================================================================
+
+def attach(root=SHARED_ROOT):
+
+    # The current version, or None when nothing was published yet
+    current = current_version(root)
+    if current is None:
+        return None
+
+    return SharedDataset(root, current['version'])
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['publish'])
+    parser.add_argument('path', nargs='?', default=DATA_PATH, help='csv file to publish')
+    parser.add_argument('--root', default=SHARED_ROOT, help='directory of the published versions')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='keep running, publishing again when the csv changes')
+    args = parser.parse_args(argv)
+
+    signature = None
+    while True:
+        if file_signature(args.path) != signature:
+            signature = file_signature(args.path)
+            print('Published '+publish(args.path, args.root)+' in '+args.root, flush=True)
+
+        if args.watch is None:
+            return
+        time.sleep(args.watch)
+
+# =============================================================================
+
+if __name__ == '__main__':
+    sys.exit(main())
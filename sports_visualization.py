@@ -1,24 +1,22 @@
+import os
+
 import streamlit as st
 from multiapp import MultiApp
 
-from yearly_statistics import yearly_statistics
-from monthly_statistics import monthly_statistics
-from time_spent import time_spent_moving_per_year
-from yearly_comparison import yearly_comparison
-from two_activities_one_year_comparison import two_activities_one_year_comparison
-from evolution_of_time_spent_exercising import evolution_of_time_spent_exercising
-from last_3_years_performance import last_3_years_performance
+from page_registry import PAGES
 
 st.set_page_config(page_title='Sports Visualizations', layout='centered')
 
 app = MultiApp()
 
-app.add_app('Division of Time Spent', time_spent_moving_per_year)
-app.add_app('Evolution of Time Spent', evolution_of_time_spent_exercising)
-app.add_app('Last 3 Years Performance', last_3_years_performance)
-app.add_app('Monthly Statistics', monthly_statistics)
-app.add_app('Two Activities - One Year Comparison', two_activities_one_year_comparison)
-app.add_app('Two Years - One Activity  Comparison', yearly_comparison)
-app.add_app('Yearly Statistics', yearly_statistics)
+# The pages are imported only when they are selected for the first time
+for title, page in PAGES:
+    app.add_app(title, page)
+
+# Keep the figure cache warm in the background, when SPORTS_WARMUP is set (once per process). The
+# warm-up imports every page, so it is only imported when it runs
+if os.environ.get('SPORTS_WARMUP', '0') == '1':
+    from warmup import start_warmup
+    start_warmup()
 
-app.run()
\ No newline at end of file
+app.run()
@@ -0,0 +1,261 @@
+"""Optional storage of the activities in a SQLite database, with the aggregations done by SQL.
+
+The activities are kept in one table, indexed on (Type, Year, Month) and on Date, and the statistics
+are computed with GROUP BY queries, so the rows never have to be loaded in the memory of the workers
+and several processes can share the same store on disk.
+
+The store of a csv is a .sqlite file next to it (rwc.csv -> rwc.sqlite), built on first use and kept
+up to date with the csv: the lines appended to the csv are inserted, any other change rebuilds it. It
+can also be built ahead of time with:
+    python sqlite_store.py [path/to/activities.csv]
+The dashboard uses it when the SPORTS_BACKEND environment variable is "sqlite", or when its data path
+is directly a .sqlite/.db file (see activity_cube.load_cube).
+"""
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pandas as pd
+
+from data_loader import (CHUNK_ROWS, DATA_PATH, file_signature, iter_csv_chunks, read_appended,
+                         read_position)
+from general_functions import METRIC_COLUMNS
+
+# Version of the layout of the store, a store written with another version is rebuilt
+STORE_FORMAT = 1
+
+STORE_SUFFIXES = ('.sqlite', '.db')
+
+# Columns of the table, with their SQL types. The dates are stored as ISO text, which sorts and
+# compares as the dates do
+STORE_COLUMNS = {'Date': 'TEXT', 'Type': 'TEXT', 'Distance_km': 'REAL', 'Hours': 'INTEGER',
+                 'Minutes': 'INTEGER', 'Seconds': 'INTEGER', 'Time_h': 'REAL', 'Calories': 'REAL',
+                 'ElevGain_m': 'REAL', 'AvgSpeed_km/h': 'REAL', 'Year': 'INTEGER', 'Month': 'INTEGER'}
+
+# =============================================================================
+
+def quote(name):
+
+    # Column names like 'AvgSpeed_km/h' are only valid in SQL between double quotes
+    return '"'+name.replace('"', '""')+'"'
+
+# =============================================================================
+
+def is_store(path):
+
+    return os.path.splitext(path)[1] in STORE_SUFFIXES
+
+# =============================================================================
+
+def store_path_for(path=DATA_PATH):
+
+    # rwc.csv -> rwc.sqlite
+    return os.path.splitext(path)[0]+'.sqlite'
+
+# =============================================================================
+
+def connect(store_path):
+
+    # One short-lived connection per query, so the store can be used from any thread or process
+    return sqlite3.connect(store_path, timeout=30)
+
+# =============================================================================
+
+def read_meta(conn):
+
+    try:
+        return {key: json.loads(value) for key, value in conn.execute('SELECT key, value FROM meta')}
+    except sqlite3.DatabaseError:
+        return {}
+
+# =============================================================================
+
+def write_meta(conn, **values):
+
+    conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                     [(key, json.dumps(value)) for key, value in values.items()])
+
+# =============================================================================
+
+def insert_activities(conn, df):
+
+    rows = df[list(STORE_COLUMNS)].copy()
+    rows['Date'] = rows['Date'].dt.strftime('%Y-%m-%d')
+    rows['Type'] = rows['Type'].astype(str)
+
+    # Missing values go in as NULL
+    rows = rows.astype(object).where(rows.notna(), None)
+
+    placeholders = ', '.join('?'*len(STORE_COLUMNS))
+    conn.executemany('INSERT INTO activities ('+', '.join(quote(col) for col in STORE_COLUMNS)+') '
+                     'VALUES ('+placeholders+')', rows.itertuples(index=False, name=None))
+
+# =============================================================================
+
+def build_store(path=DATA_PATH, store_path=None, chunk_rows=CHUNK_ROWS):
+    """Writes the activities of the csv path to a new store (store_path_for(path) by default), a chunk
+    of rows at a time, and returns its path.
+    """
+    if store_path is None:
+        store_path = store_path_for(path)
+
+    signature = file_signature(path)
+
+    # The store is written to a temporary file which then replaces the previous one, so the readers
+    # never see a half written store
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(store_path)), prefix='.tmp_store_',
+                                    suffix='.sqlite')
+    os.close(fd)
+
+    try:
+        conn = connect(tmp_path)
+        with conn:
+            conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+            conn.execute('CREATE TABLE activities ('+
+                         ', '.join(quote(col)+' '+sql_type for col, sql_type in STORE_COLUMNS.items())+')')
+
+            for chunk in iter_csv_chunks(path, list(STORE_COLUMNS), chunk_rows):
+                insert_activities(conn, chunk)
+
+            # The indexes are created after the inserts, which is faster than updating them row by row
+            conn.execute('CREATE INDEX activities_type_year_month ON activities (Type, Year, Month)')
+            conn.execute('CREATE INDEX activities_date ON activities (Date)')
+
+            # The position is only valid if the file did not change during the build
+            position = read_position(path, signature[1]) if file_signature(path) == signature else None
+            write_meta(conn, format=STORE_FORMAT, signature=list(signature), position=position)
+        conn.close()
+
+        os.replace(tmp_path, store_path)
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return store_path
+
+# =============================================================================
+
+def open_store(path=DATA_PATH):
+    """Returns the path of an up to date store of the activities in path: path itself when it is
+    already a store, otherwise the store of the csv, updated or rebuilt if the csv changed.
+    """
+    if is_store(path):
+        return path
+
+    store_path = store_path_for(path)
+    signature = file_signature(path)
+
+    if os.path.exists(store_path):
+        conn = connect(store_path)
+        try:
+            meta = read_meta(conn)
+            if meta.get('format') == STORE_FORMAT and tuple(meta.get('signature', ())) == signature:
+                return store_path
+
+            if meta.get('format') == STORE_FORMAT and meta.get('position') is not None:
+                # Take the write lock before reading the position again, so two processes do not
+                # insert the same lines
+                conn.execute('BEGIN IMMEDIATE')
+                meta = read_meta(conn)
+                if tuple(meta['signature']) == signature:
+                    conn.rollback()
+                    return store_path
+
+                appended = read_appended(path, meta['position'], list(STORE_COLUMNS))
+                if appended is not None:
+                    rows, position = appended
+                    insert_activities(conn, rows)
+                    write_meta(conn, signature=list(signature), position=position)
+                    conn.commit()
+                    return store_path
+
+                conn.rollback()
+        finally:
+            conn.close()
+
+    return build_store(path, store_path)
+
+# =============================================================================
+
+def where_clause(filters, date_range=None):
+
+    # Filters by column, with a single value or a list of values, as in general_functions.filter_mask,
+    # and the dates from start to end (both included, None for no bound), read from the index on Date
+    conditions, parameters = [], []
+    start, end = date_range if date_range is not None else (None, None)
+    if start is not None:
+        conditions.append(quote('Date')+' >= ?')
+        parameters.append(start.strftime('%Y-%m-%d'))
+    if end is not None:
+        conditions.append(quote('Date')+' <= ?')
+        parameters.append(end.strftime('%Y-%m-%d'))
+
+    for col, value in filters.items():
+        if col not in STORE_COLUMNS:
+            raise KeyError('Unknown column: '+str(col))
+
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        conditions.append(quote(col)+' IN ('+', '.join('?'*len(values))+')')
+        parameters += [value.item() if hasattr(value, 'item') else value for value in values]
+
+    return (' WHERE '+' AND '.join(conditions) if conditions else ''), parameters
+
+# =============================================================================
+
+def aggregate_store(store_path, by, date_range=None, **filters):
+    """Same as general_functions.aggregate_statistics, computed by the store: the sums of the metric
+    columns, the number of average speeds and the number of activities of the rows matching the
+    filters (and within the dates of date_range, (start, end)), grouped by the columns in by, e.g.
+        aggregate_store('rwc.sqlite', ['Year', 'Month'], Type='Running', Year=[2021, 2022])
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    for col in by:
+        if col not in STORE_COLUMNS:
+            raise KeyError('Unknown column: '+str(col))
+
+    where, parameters = where_clause(filters, date_range)
+    groups = ', '.join(quote(col) for col in by)
+
+    # The grouping follows the (Type, Year, Month) index, so SQLite reads it in order instead of
+    # sorting, and the filters on its leading columns are index lookups
+    query = 'SELECT '+groups+', '+\
+            ', '.join('TOTAL('+quote(col)+') AS '+quote(col) for col in METRIC_COLUMNS)+', '+\
+            'COUNT('+quote('AvgSpeed_km/h')+') AS speed_count, COUNT(*) AS count '+\
+            'FROM activities'+where+' GROUP BY '+groups+' ORDER BY '+groups
+
+    conn = connect(store_path)
+    try:
+        stats = pd.read_sql_query(query, conn, params=parameters)
+    finally:
+        conn.close()
+
+    # Integer parts of the duration, as in the frames
+    for col in ('Hours', 'Minutes', 'Seconds'):
+        stats[col] = stats[col].astype('int64')
+
+    return stats.set_index(by)
+
+# =============================================================================
+
+def date_bounds(store_path):
+
+    # Dates of the first and of the last activity of the store, (None, None) when it is empty
+    conn = connect(store_path)
+    try:
+        first, last = conn.execute('SELECT MIN(Date), MAX(Date) FROM activities').fetchone()
+    finally:
+        conn.close()
+
+    return tuple(None if value is None else datetime.date.fromisoformat(value[:10])
+                 for value in (first, last))
+
+# =============================================================================
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else DATA_PATH
+    print('Store written to '+build_store(source))
@@ -0,0 +1,259 @@
+"""Synthetic activity logs in the schema of rwc.csv, to see how the dashboard behaves at scale.
+
+The generator is seeded, so the same arguments always give the same log, and vectorized: the
+activities are drawn a chunk at a time, in chronological order, so logs of millions of activities are
+written without ever being held in memory.
+    python synthetic_data.py activities.csv --rows 1000000 --types 12 --athletes 50 --cache
+The profiles of Cycling, Running and Walking (speed, distance, calories, elevation, seasonality and
+missing values) were taken from rwc.csv; the other activity types are plausible guesses, and beyond
+them the types are variations of the known ones.
+
+The schema has no athlete column, the athletes only give their own fitness (speed) to the activities
+they do, which widens the distributions.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from data_loader import ColumnarCacheWriter, cache_dir_for, file_signature
+
+COLUMNS = ['Date', 'Type', 'Distance_km', 'Hours', 'Minutes', 'Seconds', 'Time_h', 'Calories',
+           'ElevGain_m', 'AvgSpeed_km/h', 'Year', 'Month']
+
+# Dtypes of the frames produced, which are the ones data_loader.optimize_dtypes gives to rwc.csv
+# (apart from the categorical Type, whose categories depend on the number of types)
+DTYPES = {'Date': 'datetime64[ns]', 'Distance_km': 'float64', 'Hours': 'int8', 'Minutes': 'int8',
+          'Seconds': 'int8', 'Time_h': 'float64', 'Calories': 'float64', 'ElevGain_m': 'float64',
+          'AvgSpeed_km/h': 'float64', 'Year': 'int16', 'Month': 'int8'}
+
+# Profile of every activity type:
+#   share: relative number of activities
+#   speed, distance: mean and standard deviation, in km/h and km
+#   calories_h: calories burned per hour
+#   elevation_km: elevation gain per km, in m
+#   peak_month, seasonality: month with the most activities and relative amplitude of the variation
+#   missing: probability of not having the calories, the elevation gain and the average speed
+PROFILES = {
+    'Cycling': {'share': 207, 'speed': (24.3, 5.3), 'distance': (25.0, 6.9), 'calories_h': 525,
+                'elevation_km': 16.5, 'peak_month': 7, 'seasonality': 0.3, 'missing': (0.02, 0.73, 0.0)},
+    'Running': {'share': 245, 'speed': (10.7, 0.75), 'distance': (9.3, 2.4), 'calories_h': 640,
+                'elevation_km': 17.7, 'peak_month': 3, 'seasonality': 0.25, 'missing': (0.025, 0.35, 0.0)},
+    'Walking': {'share': 154, 'speed': (5.0, 0.4), 'distance': (4.0, 1.15), 'calories_h': 195,
+                'elevation_km': 16.0, 'peak_month': 1, 'seasonality': 0.5, 'missing': (0.013, 0.42, 0.006)},
+    'Swimming': {'share': 80, 'speed': (2.4, 0.4), 'distance': (2.0, 0.6), 'calories_h': 500,
+                 'elevation_km': 0.0, 'peak_month': 7, 'seasonality': 0.6, 'missing': (0.02, 1.0, 0.0)},
+    'Hiking': {'share': 60, 'speed': (4.0, 0.6), 'distance': (12.0, 4.0), 'calories_h': 400,
+               'elevation_km': 60.0, 'peak_month': 8, 'seasonality': 0.6, 'missing': (0.02, 0.2, 0.0)},
+    'Rowing': {'share': 40, 'speed': (9.0, 1.2), 'distance': (8.0, 2.0), 'calories_h': 550,
+               'elevation_km': 0.0, 'peak_month': 6, 'seasonality': 0.4, 'missing': (0.02, 1.0, 0.0)},
+    'Skiing': {'share': 30, 'speed': (11.0, 2.5), 'distance': (15.0, 5.0), 'calories_h': 600,
+               'elevation_km': 20.0, 'peak_month': 1, 'seasonality': 0.95, 'missing': (0.02, 0.3, 0.0)},
+    'Trail Running': {'share': 50, 'speed': (8.5, 1.0), 'distance': (14.0, 4.0), 'calories_h': 700,
+                      'elevation_km': 40.0, 'peak_month': 9, 'seasonality': 0.3, 'missing': (0.02, 0.1, 0.0)},
+    'Mountain Biking': {'share': 50, 'speed': (15.0, 3.0), 'distance': (25.0, 8.0), 'calories_h': 600,
+                        'elevation_km': 35.0, 'peak_month': 6, 'seasonality': 0.4, 'missing': (0.02, 0.1, 0.0)},
+    'Kayaking': {'share': 25, 'speed': (6.0, 1.0), 'distance': (10.0, 3.0), 'calories_h': 350,
+                 'elevation_km': 0.0, 'peak_month': 7, 'seasonality': 0.8, 'missing': (0.02, 1.0, 0.0)},
+}
+
+# =============================================================================
+
+def activity_profiles(n_types, seed=0):
+
+    # The known profiles first, then variations of them named "Activity <n>"
+    names = list(PROFILES)[:n_types]
+    profiles = [PROFILES[name] for name in names]
+
+    rng = np.random.default_rng([seed, 1])
+    for i in range(len(names), n_types):
+        base = PROFILES[names[i % len(PROFILES)]]
+        scale = rng.uniform(0.7, 1.3)
+        profiles.append(dict(base, share=base['share']*rng.uniform(0.2, 1.0),
+                             speed=(base['speed'][0]*scale, base['speed'][1]*scale),
+                             distance=(base['distance'][0]*scale, base['distance'][1]*scale),
+                             peak_month=int(rng.integers(1, 13))))
+        names.append('Activity '+str(i+1))
+
+    return names, profiles
+
+# =============================================================================
+
+def daily_counts(n_rows, days, profiles, rng):
+    """Number of activities of every type in every day, as an array of shape (days, types) which
+    sums to n_rows.
+    """
+    day_of_year = days.dayofyear.to_numpy()
+
+    weights = np.empty((len(days), len(profiles)))
+    for j, profile in enumerate(profiles):
+        # Cosine around the mid-day of the peak month
+        peak_day = (profile['peak_month']-0.5)*365.25/12
+        season = 1+profile['seasonality']*np.cos(2*np.pi*(day_of_year-peak_day)/365.25)
+        weights[:, j] = profile['share']*season
+
+    # One draw for all the cells, so the total is exact
+    counts = rng.multinomial(n_rows, (weights/weights.sum()).ravel())
+
+    return counts.reshape(weights.shape)
+
+# =============================================================================
+
+def activities_chunk(day_index, type_index, days, profiles, fitness, rng):
+
+    n = len(day_index)
+
+    def profile_values(key, position=None):
+        values = np.array([profile[key] if position is None else profile[key][position]
+                           for profile in profiles], dtype='float64')
+        return values[type_index]
+
+    # Speed of the activity, scaled by the fitness of the athlete who did it
+    athlete = rng.integers(0, len(fitness), n)
+    speed = rng.normal(profile_values('speed', 0), profile_values('speed', 1))*fitness[athlete]
+    speed = np.maximum(speed, 0.4*profile_values('speed', 0))
+
+    # Gamma distributed distances (positive and right-skewed) with the mean and deviation of the type
+    shape = (profile_values('distance', 0)/profile_values('distance', 1))**2
+    distance = np.round(rng.gamma(shape, profile_values('distance', 0)/shape), 2)
+    distance = np.maximum(distance, 0.1)
+
+    # The duration comes from the distance and the speed, rounded to the second as in the log
+    seconds = np.maximum(np.round(distance/speed*3600), 60).astype('int64')
+    hours, rest = np.divmod(seconds, 3600)
+    minutes, seconds = np.divmod(rest, 60)
+    time_h = hours+minutes/60+seconds/3600
+
+    calories = np.round(profile_values('calories_h')*time_h*rng.normal(1, 0.15, n).clip(0.5))
+    elevation = np.round(profile_values('elevation_km')*distance*rng.gamma(4, 0.25, n))
+
+    # Missing values, with the probabilities of the type
+    calories[rng.random(n) < profile_values('missing', 0)] = np.nan
+    elevation[rng.random(n) < profile_values('missing', 1)] = np.nan
+    avg_speed = distance/time_h
+    avg_speed[rng.random(n) < profile_values('missing', 2)] = np.nan
+
+    dates = days[day_index]
+
+    return pd.DataFrame({'Date': dates, 'Type': type_index, 'Distance_km': distance, 'Hours': hours,
+                         'Minutes': minutes, 'Seconds': seconds, 'Time_h': time_h, 'Calories': calories,
+                         'ElevGain_m': elevation, 'AvgSpeed_km/h': avg_speed, 'Year': dates.year,
+                         'Month': dates.month})
+
+# =============================================================================
+
+def generate_activities(n_rows, seed=0, n_types=3, athletes=1, start_year=2015, end_year=2023,
+                        chunk_size=100000):
+    """Yields the activities of a synthetic log, in chronological order, as frames of about chunk_size
+    rows with the columns and dtypes of rwc.csv once loaded (see data_loader), and a running index.
+    """
+    names, profiles = activity_profiles(n_types, seed)
+    type_dtype = pd.CategoricalDtype(names)
+
+    rng = np.random.default_rng(seed)
+    days = pd.date_range(str(start_year)+'-01-01', str(end_year)+'-12-31', freq='D')
+    counts = daily_counts(n_rows, days, profiles, rng)
+
+    # Fitness of every athlete, as a factor of the speed
+    fitness = rng.lognormal(0, 0.1 if athletes > 1 else 0, athletes)
+
+    # The chunks are blocks of consecutive days, cut when they reach chunk_size activities
+    rows_per_day = counts.sum(axis=1)
+    cuts = np.searchsorted(np.cumsum(rows_per_day), np.arange(chunk_size, n_rows, chunk_size))
+    bounds = np.unique(np.concatenate([[0], cuts+1, [len(days)]]).clip(0, len(days)))
+
+    first_row = 0
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        block = counts[start:end]
+        if not block.any():
+            continue
+
+        # One row per activity of the block: the day and the type of every cell, repeated as many
+        # times as there are activities in the cell
+        day_index = np.repeat(np.arange(start, end), block.shape[1])
+        type_index = np.tile(np.arange(block.shape[1]), end-start)
+        day_index, type_index = np.repeat(day_index, block.ravel()), np.repeat(type_index, block.ravel())
+
+        chunk = activities_chunk(day_index, type_index, days, profiles, fitness, rng)
+        chunk['Type'] = pd.Categorical.from_codes(type_index, dtype=type_dtype)
+        chunk = chunk.astype(DTYPES)[COLUMNS]
+
+        chunk.index = pd.RangeIndex(first_row, first_row+len(chunk))
+        first_row += len(chunk)
+
+        yield chunk
+
+# =============================================================================
+
+def format_dates(dates):
+
+    # Same format as rwc.csv: month/day/year, without leading zeros
+    return dates.dt.month.astype(str)+'/'+dates.dt.day.astype(str)+'/'+dates.dt.year.astype(str)
+
+# =============================================================================
+
+def write_synthetic_log(path, n_rows, seed=0, n_types=3, athletes=1, start_year=2015, end_year=2023,
+                        chunk_size=100000, csv=True, cache=False):
+    """Writes a synthetic log of n_rows activities to the csv path and/or to its columnar cache (the
+    one data_loader reads, in cache_dir_for(path)), a chunk at a time.
+    When only the cache is written, it can be read with data_loader.read_columnar_cache.
+    """
+    if not (csv or cache):
+        raise ValueError('Nothing to write: choose the csv, the cache or both')
+
+    names, profiles = activity_profiles(n_types, seed)
+
+    writer = None
+    if cache:
+        dtypes = dict(DTYPES, Type=pd.CategoricalDtype(names))
+        writer = ColumnarCacheWriter(cache_dir_for(path), n_rows, {col: dtypes[col] for col in COLUMNS})
+
+    try:
+        header = True
+        for chunk in generate_activities(n_rows, seed, n_types, athletes, start_year, end_year, chunk_size):
+            if writer is not None:
+                writer.write(chunk)
+
+            if csv:
+                text = chunk.assign(Date=format_dates(chunk.Date))
+                text.to_csv(path, mode='w' if header else 'a', header=header)
+                header = False
+
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    if writer is not None:
+        # The cache is tied to the csv written with it, so data_loader uses it instead of parsing
+        writer.close(file_signature(path) if csv else (0, 0))
+
+# =============================================================================
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='csv file to write')
+    parser.add_argument('--rows', type=int, default=100000, help='number of activities')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--types', type=int, default=3, help='number of activity types')
+    parser.add_argument('--athletes', type=int, default=1)
+    parser.add_argument('--years', type=int, nargs=2, default=[2015, 2023], metavar=('FIRST', 'LAST'))
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--cache', action='store_true', help='also write the columnar cache')
+    parser.add_argument('--cache-only', action='store_true', help='only write the columnar cache')
+    args = parser.parse_args(argv)
+
+    write_synthetic_log(args.path, args.rows, args.seed, args.types, args.athletes, args.years[0],
+                        args.years[1], args.chunk_size, csv=not args.cache_only,
+                        cache=args.cache or args.cache_only)
+
+    written = [] if args.cache_only else [args.path]
+    if args.cache or args.cache_only:
+        written.append(cache_dir_for(args.path))
+    print(str(args.rows)+' activities written to '+' and '.join(written))
+
+# =============================================================================
+
+if __name__ == '__main__':
+    main()
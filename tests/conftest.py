@@ -0,0 +1,65 @@
+"""Fixtures shared by the tests.
+
+The tests are run from the root of the repository:
+    python -m pytest -q
+"""
+import os
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+# The modules of the dashboard are at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# =============================================================================
+
+@pytest.fixture
+def activities_csv(tmp_path):
+
+    # A copy of the real log, so the caches and the stores written next to it stay in tmp_path
+    path = str(tmp_path/'rwc.csv')
+    shutil.copy(os.path.join(ROOT, 'rwc.csv'), path)
+
+    return path
+
+# =============================================================================
+
+def write_log(path, keep=None):
+
+    # Writes the rows of the real log (those where keep is True) to path, in the same format
+    df = pd.read_csv(os.path.join(ROOT, 'rwc.csv'), index_col=0)
+    if keep is not None:
+        df = df[keep(df)]
+    df.to_csv(path)
+
+    return str(path)
+
+# =============================================================================
+
+def append_rows(path, n_rows):
+
+    # Appends a copy of the last n_rows activities of path, with new numbers, as a logging tool would
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    number = int(lines[-1].split(',', 1)[0])+1
+    with open(path, 'a') as f:
+        for line in lines[-n_rows:]:
+            f.write(str(number)+','+line.split(',', 1)[1]+'\n')
+            number += 1
+
+# =============================================================================
+
+def assert_same_cube(cube, expected):
+
+    # Same cells and statistics, whatever the dtypes of the levels and the order of the activity types
+    def normalized(cube):
+        cube = cube.reset_index()
+        cube['Type'] = cube['Type'].astype(str)
+        cube = cube.sort_values(['Type', 'Year', 'Month']).reset_index(drop=True)
+        return cube.astype('float64', errors='ignore').astype({'Type': str})
+
+    pd.testing.assert_frame_equal(normalized(cube), normalized(expected), check_dtype=False)
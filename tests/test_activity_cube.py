@@ -0,0 +1,100 @@
+import os
+
+import pytest
+
+import activity_cube
+from activity_cube import activities, build_cube, load_cube, years
+from conftest import append_rows, assert_same_cube, write_log
+from data_loader import build_columnar_cache, read_csv_activities
+
+# =============================================================================
+
+def test_cube_of_columnar_cache_equals_streamed_cube(activities_csv):
+
+    streamed = activity_cube.stream_cube(activities_csv)
+
+    build_columnar_cache(activities_csv)
+    assert_same_cube(load_cube(activities_csv), streamed)
+
+# =============================================================================
+
+def test_appended_cube_equals_rebuild(activities_csv, monkeypatch):
+
+    load_cube(activities_csv)
+    append_rows(activities_csv, 25)
+
+    # Only the appended lines are read
+    def rebuild(*args, **kwargs):
+        raise AssertionError('The cube was rebuilt instead of updated')
+    monkeypatch.setattr(activity_cube, 'stream_cube', rebuild)
+
+    cube = load_cube(activities_csv)
+    assert_same_cube(cube, build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+def test_rewritten_csv_rebuilds_cube(activities_csv):
+
+    load_cube(activities_csv)
+
+    # An edit of the lines already read is not an append
+    with open(activities_csv) as f:
+        lines = f.read().splitlines()
+    with open(activities_csv, 'w') as f:
+        f.write('\n'.join(lines[:1]+lines[2:])+'\n')
+
+    assert_same_cube(load_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+def edit_middle_line(path):
+
+    # Changes the last digit of the distance of a line in the middle of the file, in place, so the size
+    # stays the same, and moves its mtime
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+
+    start = data.index(b'\n', len(data)//2)+1
+    fields = data[start:data.index(b'\n', start)].split(b',')
+    digit = start+len(b','.join(fields[:4]))-1
+    data[digit:digit+1] = b'1' if data[digit:digit+1] != b'1' else b'2'
+
+    stat = os.stat(path)
+    with open(path, 'r+b') as f:
+        f.write(data)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns+10**9))
+
+# =============================================================================
+
+@pytest.mark.parametrize('appended_rows', [0, 25])
+def test_edited_csv_rebuilds_cube(activities_csv, appended_rows):
+
+    # A log of a few hundred KB, so the edit is far from its start and from its end
+    for i in range(4):
+        append_rows(activities_csv, 600)
+    load_cube(activities_csv)
+
+    # An edit in the middle of the lines already read, with or without lines appended after it
+    edit_middle_line(activities_csv)
+    if appended_rows:
+        append_rows(activities_csv, appended_rows)
+
+    assert_same_cube(load_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+def test_gap_year(tmp_path):
+
+    # A year between the first and the last one without any activity
+    path = write_log(tmp_path/'rwc.csv', lambda df: df.Year != 2017)
+    cube = load_cube(path)
+
+    assert 2017 not in years(cube) and min(years(cube)) < 2017 < max(years(cube))
+    assert activities(cube, 2017) == []
+    assert years(cube, 'Swimming') == []
+    assert activities(cube, 2018) == activities(load_cube('rwc.csv'), 2018)
+
+    # The service accepts the year, and answers it has no activities
+    from query_service import parse_query
+    from queries import run_query
+    assert run_query(cube, parse_query('activities', [('year', '2017')], cube)).empty
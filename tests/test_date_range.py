@@ -0,0 +1,86 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_loader
+from activity_cube import build_cube, load_cube
+from conftest import assert_same_cube
+from data_loader import build_columnar_cache, read_csv_activities
+from date_range import DateIndex, load_date_index, preset_range, range_cube
+
+RANGES = [(datetime.date(2021, 1, 1), datetime.date(2021, 12, 31)),
+          (datetime.date(2020, 6, 15), datetime.date(2022, 3, 31)),
+          (None, datetime.date(2016, 12, 31)),
+          (datetime.date(2023, 1, 1), None),
+          (datetime.date(2019, 8, 3), datetime.date(2019, 8, 3))]
+
+# =============================================================================
+
+def date_mask(dates, start, end):
+
+    # The activities from start to end, both included, by a scan of all the dates
+    dates = pd.Series(dates)
+    mask = dates.notna()
+    if start is not None:
+        mask &= dates >= pd.Timestamp(start)
+    if end is not None:
+        mask &= dates < pd.Timestamp(end+datetime.timedelta(days=1))
+
+    return mask.to_numpy()
+
+# =============================================================================
+
+@pytest.mark.parametrize('start, end', RANGES)
+def test_slice_equals_mask(start, end):
+
+    # Dates out of order, with times of the day and missing ones
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp('2015-07-01')+pd.to_timedelta(rng.integers(0, 3000*24, 500), unit='h')
+    dates = dates.to_numpy().copy()
+    dates[::37] = np.datetime64('NaT')
+
+    index = DateIndex(dates, {'Distance_km': np.arange(len(dates), dtype=float)}, [])
+    expected = np.arange(len(dates))[date_mask(dates, start, end)]
+
+    lo, hi = index.positions(start, end)
+    assert hi-lo == len(expected)
+    assert sorted(index.slice(start, end)['Distance_km']) == list(expected)
+
+# =============================================================================
+
+@pytest.mark.parametrize('columnar_cache', [False, True])
+def test_range_cubes(activities_csv, columnar_cache, monkeypatch):
+
+    if columnar_cache:
+        build_columnar_cache(activities_csv)
+    df = read_csv_activities(activities_csv)
+    load_cube(activities_csv)
+
+    # The index is built from the columnar cache or from the columns of the cube, never from a full read
+    monkeypatch.setattr(data_loader, 'read_csv_activities', None)
+    load_date_index(activities_csv)
+
+    for start, end in RANGES:
+        cube = range_cube(start, end, activities_csv)
+        assert_same_cube(cube, build_cube(df[date_mask(df.Date, start, end)]))
+
+# =============================================================================
+
+def test_types_in_order_of_cube(activities_csv):
+
+    order = list(load_cube(activities_csv).index.get_level_values('Type').unique())
+
+    assert load_date_index(activities_csv).types[:len(order)] == order
+
+# =============================================================================
+
+def test_presets():
+
+    first, last = datetime.date(2015, 7, 14), datetime.date(2023, 2, 10)
+
+    assert preset_range('Last 30 days', first, last) == (datetime.date(2023, 1, 12), last)
+    assert preset_range('This season', first, last) == (datetime.date(2023, 1, 1), last)
+    assert preset_range('Last 365 days', datetime.date(2022, 12, 1), last) == (datetime.date(2022, 12, 1), last)
+    assert preset_range('All time', first, last) is None
@@ -0,0 +1,34 @@
+import json
+import os
+
+from export_views import MANIFEST, export_all
+
+PAGES = [('Division of Time Spent', 'time_spent:time_spent_moving_per_year'),
+         ('Evolution of Time Spent', 'evolution_of_time_spent_exercising:evolution_of_time_spent_exercising')]
+
+# =============================================================================
+
+def test_subset_export_keeps_other_pages(activities_csv, tmp_path):
+
+    out_dir = str(tmp_path/'export')
+    n_views, n_html, n_png = export_all(out_dir, PAGES, activities_csv, workers=1, png=False)
+    assert n_views == n_html > 0
+
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+
+    # Only the views of time_spent are exported again, and they did not change
+    n_views, n_html, n_png = export_all(out_dir, PAGES[:1], activities_csv, workers=1, png=False)
+    assert n_views > 0 and n_html == 0
+
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        assert json.load(f) == manifest
+
+    with open(os.path.join(out_dir, 'index.html')) as f:
+        index = f.read()
+
+    for relative_path, entry in manifest.items():
+        assert os.path.exists(os.path.join(out_dir, relative_path))
+        assert relative_path in index
+    assert {entry['page'] for entry in manifest.values()} == {'time_spent', 'evolution_of_time_spent_exercising'}
+    assert 'Evolution of Time Spent' in index
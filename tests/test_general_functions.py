@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from conftest import write_log
+from general_functions import create_color_time_spent_columns
+
+# =============================================================================
+
+@pytest.mark.parametrize('statistic', ['Count', 'Distance', 'Time'])
+def test_colors_of_empty_frame(statistic):
+
+    activity_df = pd.DataFrame({'Distance_km': [], 'Time_h': [], 'count': []})
+    create_color_time_spent_columns(activity_df, statistic)
+
+    assert activity_df.empty
+    assert list(activity_df.columns[-2:]) == ['color', 'time_spent']
+
+# =============================================================================
+
+def test_colors_and_time_labels():
+
+    activity_df = pd.DataFrame({'Distance_km': [1., 3., 2.], 'Time_h': [1.5, 2., 0.25], 'count': [2, 1, 3]})
+    create_color_time_spent_columns(activity_df, 'Distance')
+
+    assert list(activity_df.color) == ['green', 'red', 'blue']
+    assert list(activity_df.time_spent) == ["1:30'", '2', "0:15'"]
+
+# =============================================================================
+
+def test_year_without_activities_of_type(tmp_path):
+
+    # A year inside the range of the slider of Walking, without any walk
+    from activity_cube import load_cube
+    from monthly_statistics import monthly_statistics_figure
+
+    path = write_log(tmp_path/'rwc.csv', lambda df: ~((df.Type == 'Walking') & (df.Year == 2017)))
+    cube = load_cube(path)
+
+    for statistic in ('Count', 'Distance', 'Time'):
+        monthly_statistics_figure(cube, 'Walking', statistic, 2017)
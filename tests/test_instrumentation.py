@@ -0,0 +1,19 @@
+import json
+import logging
+
+from instrumentation import stage, trace_page
+
+# =============================================================================
+
+def test_repeated_stage_keeps_every_duration(caplog):
+
+    with caplog.at_level(logging.INFO, logger='sports.render'):
+        with trace_page('monthly_statistics') as trace:
+            for name in ('load', 'aggregate', 'labels', 'aggregate'):
+                with stage(name):
+                    pass
+
+    logged = json.loads(caplog.records[-1].getMessage())
+
+    assert [name for name, ms in logged['stages']] == ['load', 'aggregate', 'labels', 'aggregate']
+    assert [ms for name, ms in logged['stages']] == [round(seconds*1000, 3) for name, seconds in trace.stages]
@@ -0,0 +1,70 @@
+import io
+
+import pandas as pd
+import pytest
+
+from activity_cube import load_cube
+from queries import DECIMALS, VIEWS, answer_queries, run_query, write_csv
+
+QUERIES = [{'view': 'yearly', 'activity': 'Running'},
+           {'view': 'monthly', 'activity': 'Cycling', 'year': 2021},
+           {'view': 'time_share', 'year': 2022},
+           {'view': 'evolution'},
+           {'view': 'comparison', 'series': [['Running', 2021], ['Walking', 2021]]}]
+
+# =============================================================================
+
+@pytest.fixture(scope='module')
+def cube():
+    return load_cube('rwc.csv')
+
+# =============================================================================
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_answers_have_no_sums_of_speeds(cube, query):
+
+    frame = run_query(cube, query)
+
+    assert 'AvgSpeed_km/h' not in frame
+    assert 'avg_speed' in frame
+
+# =============================================================================
+
+def test_durations_are_carried(cube):
+
+    frame = run_query(cube, {'view': 'yearly', 'activity': 'Walking'})
+
+    assert (frame.Minutes < 60).all() and (frame.Seconds < 60).all()
+    seconds = frame.Hours*3600+frame.Minutes*60+frame.Seconds
+    assert ((seconds/3600-frame.Time_h).abs() < 0.01*frame['count']).all()
+
+# =============================================================================
+
+def test_average_speed_is_a_mean(cube):
+
+    df = pd.read_csv('rwc.csv', index_col=0)
+    expected = df[df.Type == 'Running'].groupby('Year')['AvgSpeed_km/h'].mean().round(2)
+
+    frame = run_query(cube, {'view': 'yearly', 'activity': 'Running'}).set_index('Year')
+
+    pd.testing.assert_series_equal(frame.avg_speed, expected, check_names=False)
+
+# =============================================================================
+
+def test_csv_numbers_are_rounded(cube):
+
+    out = io.StringIO()
+    write_csv(answer_queries(cube, QUERIES), out)
+    out.seek(0)
+
+    for value in pd.read_csv(out, dtype=str).stack():
+        assert len(value.partition('.')[2]) <= DECIMALS
+
+# =============================================================================
+
+def test_unknown_view(cube):
+
+    with pytest.raises(KeyError):
+        run_query(cube, {'view': 'weekly'})
+
+    assert 'weekly' not in VIEWS
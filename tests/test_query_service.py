@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import pytest
+
+from activity_cube import load_cube
+from query_service import QueryService, parse_query
+
+# =============================================================================
+
+@pytest.mark.parametrize('view, pairs', [('monthly', [('activity', 'Running'), ('year', 'abc')]),
+                                         ('monthly', [('activity', 'Running'), ('year', '1999')]),
+                                         ('monthly', [('activity', 'Running'), ('year', '')]),
+                                         ('yearly', [('activity', 'Swimming')]),
+                                         ('yearly', []),
+                                         ('yearly', [('activity', 'Running'), ('activity', 'Walking')]),
+                                         ('evolution', [('year', '2021')]),
+                                         ('comparison', [('series', 'Running-2021')]),
+                                         ('comparison', [('series', 'Running:2021,Walking:')]),
+                                         ('monthly', [('activity', 'Running'), ('year', '2021'),
+                                                      ('fill_months', 'maybe')])])
+def test_bad_arguments(view, pairs):
+
+    with pytest.raises(ValueError):
+        parse_query(view, pairs, load_cube('rwc.csv'))
+
+# =============================================================================
+
+def test_arguments():
+
+    cube = load_cube('rwc.csv')
+
+    assert parse_query('monthly', [('activity', 'Running'), ('year', '2021'), ('fill_months', '0')], cube) == \
+        {'view': 'monthly', 'activity': 'Running', 'year': 2021, 'fill_months': False}
+    assert parse_query('comparison', [('series', 'Running:2021,Walking:2022')], cube) == \
+        {'view': 'comparison', 'series': [['Running', 2021], ['Walking', 2022]]}
+
+# =============================================================================
+
+async def request(port, method, target, headers=()):
+
+    # Status, headers and body of one request, on a connection of its own
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(('\r\n'.join([method+' '+target+' HTTP/1.1', 'Connection: close']+list(headers))+'\r\n\r\n').encode())
+
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    body = await reader.read()
+    writer.close()
+
+    response_headers = dict(line.split(': ', 1) for line in head[1:] if line)
+    return int(head[0].split(' ')[1]), response_headers, body.decode()
+
+# =============================================================================
+
+def serve(requests):
+
+    # Answers of the requests, made in turn to a service on a free port
+    async def run():
+        service = QueryService('rwc.csv')
+        service.loaded = asyncio.Event()
+        refresh = asyncio.ensure_future(service.refresh())
+
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await request(port, *arguments) for arguments in requests]
+        finally:
+            refresh.cancel()
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(run())
+
+# =============================================================================
+
+def test_bad_request():
+
+    status, headers, body = serve([('GET', '/monthly?activity=Running&year=abc')])[0]
+
+    assert status == 400
+    assert 'year' in json.loads(body)['error']
+
+# =============================================================================
+
+def test_etag():
+
+    first, second, other = serve([('GET', '/yearly?activity=Running'),
+                                  ('GET', '/yearly?activity=Running', ['If-None-Match: "other", "x"']),
+                                  ('GET', '/yearly?activity=Walking')])
+    status, headers, body = first
+    assert status == 200 and json.loads(body)['rows']
+    assert second[0] == 200 and second[1]['ETag'] == headers['ETag']
+    assert other[1]['ETag'] != headers['ETag']
+
+    status, not_modified, body = serve([('GET', '/yearly?activity=Running', ['If-None-Match: '+headers['ETag']])])[0]
+    assert status == 304 and body == ''
+    assert not_modified['ETag'] == headers['ETag']
+
+# =============================================================================
+
+def test_head():
+
+    target = '/monthly?activity=Running&year=2021'
+    get, head = serve([('GET', target), ('HEAD', target)])
+
+    assert head[0] == get[0] == 200
+    assert head[2] == ''
+    assert int(head[1]['Content-Length']) == len(get[2].encode()) > 0
+    assert head[1]['ETag'] == get[1]['ETag']
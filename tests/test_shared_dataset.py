@@ -0,0 +1,41 @@
+import activity_cube
+import shared_dataset
+from activity_cube import build_cube, load_cube
+from conftest import append_rows, assert_same_cube
+from data_loader import read_csv_activities
+
+# =============================================================================
+
+def use_shared_backend(monkeypatch, root):
+
+    # The versions published in root, instead of the shared directory of the deployment
+    monkeypatch.setattr(activity_cube, 'BACKEND', 'shared')
+    monkeypatch.setattr(activity_cube, 'SHARED_ROOT', root)
+    monkeypatch.setattr(activity_cube, 'current_version', lambda: shared_dataset.current_version(root))
+    monkeypatch.setattr(activity_cube, '_cache', {})
+
+# =============================================================================
+
+def test_shared_cube_equals_rebuild(activities_csv, tmp_path, monkeypatch):
+
+    root = str(tmp_path/'shared')
+    use_shared_backend(monkeypatch, root)
+    shared_dataset.publish(activities_csv, root)
+
+    assert_same_cube(load_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+def test_new_version_is_loaded(activities_csv, tmp_path, monkeypatch):
+
+    root = str(tmp_path/'shared')
+    use_shared_backend(monkeypatch, root)
+    shared_dataset.publish(activities_csv, root)
+    load_cube(activities_csv)
+
+    append_rows(activities_csv, 25)
+    version = shared_dataset.publish(activities_csv, root)
+
+    assert activity_cube.data_version(activities_csv) != version
+    assert_same_cube(load_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+    assert activity_cube.data_version(activities_csv) == version
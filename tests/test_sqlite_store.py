@@ -0,0 +1,95 @@
+import datetime
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from activity_cube import StoreCube, build_cube, load_cube, rollup, store_cube
+from conftest import append_rows, assert_same_cube
+from data_loader import read_csv_activities
+from sqlite_store import open_store, where_clause
+from test_activity_cube import edit_middle_line
+
+# Filters of the views of the pages
+FILTERS = [('Year', {'Type': 'Running'}),
+           ('Month', {'Type': 'Walking', 'Year': 2019}),
+           ('Type', {'Year': 2021}),
+           (['Type', 'Year'], {}),
+           (['Type', 'Year', 'Month'], {'Type': ['Cycling', 'Running'], 'Year': [2021, 2022]})]
+
+# =============================================================================
+
+def assert_same_rollup(stats, expected):
+
+    # The activity types compared by name, the categories of the two cubes being different
+    stats, expected = stats.reset_index(), expected.reset_index()
+    if 'Type' in stats:
+        stats['Type'], expected['Type'] = stats['Type'].astype(str), expected['Type'].astype(str)
+
+    pd.testing.assert_frame_equal(stats, expected, check_dtype=False)
+
+# =============================================================================
+
+def test_store_cube_equals_rebuild(activities_csv):
+
+    assert_same_cube(store_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+def test_appended_store_equals_rebuild(activities_csv):
+
+    open_store(activities_csv)
+    append_rows(activities_csv, 25)
+
+    assert_same_cube(store_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+def test_edited_store_equals_rebuild(activities_csv):
+
+    for i in range(4):
+        append_rows(activities_csv, 600)
+    open_store(activities_csv)
+    edit_middle_line(activities_csv)
+
+    assert_same_cube(store_cube(activities_csv), build_cube(read_csv_activities(activities_csv)))
+
+# =============================================================================
+
+@pytest.mark.parametrize('by, filters', FILTERS)
+def test_rollups_of_store(activities_csv, by, filters):
+
+    cube = load_cube(open_store(activities_csv))
+    assert isinstance(cube, StoreCube)
+
+    assert_same_rollup(rollup(cube, by, **filters), rollup(load_cube(activities_csv), by, **filters))
+
+# =============================================================================
+
+@pytest.mark.parametrize('by, filters', FILTERS)
+def test_rollups_of_date_range(activities_csv, by, filters):
+
+    start, end = datetime.date(2020, 6, 15), datetime.date(2022, 3, 31)
+    cube = StoreCube(open_store(activities_csv), (start, end))
+
+    df = read_csv_activities(activities_csv)
+    expected = build_cube(df[(df.Date >= pd.Timestamp(start)) & (df.Date <= pd.Timestamp(end))])
+
+    assert_same_rollup(rollup(cube, by, **filters), rollup(expected, by, **filters))
+
+# =============================================================================
+
+def test_filters_are_index_searches(activities_csv):
+
+    # The filters of the views and the date ranges are WHERE clauses read from the indexes of the store
+    conn = sqlite3.connect(open_store(activities_csv))
+    try:
+        for filters, date_range in [({'Type': 'Running', 'Year': 2019}, None),
+                                    ({}, (datetime.date(2022, 1, 1), datetime.date(2022, 3, 31)))]:
+            where, parameters = where_clause(filters, date_range)
+            plan = conn.execute('EXPLAIN QUERY PLAN SELECT COUNT(*) FROM activities'+where, parameters).fetchall()
+
+            assert where.startswith(' WHERE ')
+            assert any('SEARCH activities USING' in step[-1] for step in plan)
+    finally:
+        conn.close()
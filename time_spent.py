@@ -2,8 +2,16 @@ import streamlit as st
 
 import numpy as np
 import pandas as pd
+from functools import partial
 from math import radians
 
+from activity_cube import years
+from date_range import page_cube, year_slider
+from figure_cache import show_figure
+from general_functions import format_duration
+from instrumentation import stage, trace_selectors
+from queries import time_share
+
 from bokeh.models import ColumnDataSource, Label
 from bokeh.plotting import figure
 from bokeh.transform import cumsum
@@ -13,124 +21,97 @@ def time_spent_moving_per_year():
     # Page title
     st.markdown("<h1 style='text-align: center;'>Division of Time Spent</h1>", unsafe_allow_html=True)
     
-    # Load the dataframe
-    df = pd.read_csv('rwc.csv', index_col=0, parse_dates=['Date'])
-    
-    # Get the years available
-    year_options = df.Year.unique()
-    
-    year = st.slider('Year', int(min(year_options)), int(max(year_options)), step=1)
+    # Load the aggregates of the activities of the dates chosen in the sidebar
+    with stage('load'):
+        cube, date_range = page_cube()
     
-    # Select the data respective to that year, group it by type and sum it
-    year_df = df.loc[df.Year==year].groupby('Type').sum()
-    
-    # Create a column for the labels of the time and for the colors of the sectors (red is running, green
-    # is walking and blue is cycling)
-    time_spent, color = [], []
-    for activity in year_df.index:
-        hours = int(year_df.Time_h[activity]) # Number of hours
-        # Number of minutes, besides the hours already accounted
-        minutes = int((year_df.Time_h[activity]-hours)*60) 
-        
-        # Format the number of minutes
-        # When the number of minutes is between 1 and 9, add a 0 before it
-        time = None
-        if len(str(minutes)) == 1 and minutes != 0:
-            minutes = '0'+str(minutes)
-            
-        # When the number of minutes is 0, the label is just the hours
-        elif minutes == 0:
-            time = str(hours) 
-        
-        if type(time) != str: # If time is already defined, this step will not be taken
-            time = str(hours)+':'+str(minutes)+'\'' # Create the label
-        
-        time_spent.append(time) # Add the label to the list
-        
-        if activity == 'Running':
-            color.append('red')
-        
-        elif activity == 'Walking':
-            color.append('green')
-            
-        else:
-            color.append('blue')
+    if cube is None:
+        return
     
-    year_df['time_spent'] = time_spent # Add the list as columns
-    year_df['sector_color'] = color 
+    # Get the years available
+    year_options = years(cube)
     
-    # Add a column for the number of activities
-    year_df['counter'] = df.loc[df.Year==year].groupby('Type').count()['Date']
+    year = year_slider(st, 'Year', year_options)
+    trace_selectors(year=year)
     
-    # Sort the dataframe by the value of the time in h
-    year_df = year_df.sort_values(by='Time_h')
+    # Show the figure, which is only built when it is not cached
+    show_figure('time_spent', (year,), lambda: time_spent_figure(cube, year), date_range=date_range)
+
+def time_spent_moving_per_year_views(cube):
     
-    # Percentage of time spent in each activity
-    year_df['time_percentage'] = [year_df.Time_h[activity]/year_df.Time_h.sum() for activity in year_df.index]
+    # Every year of the slider
+    year_options = years(cube)
+    for year in range(int(min(year_options)), int(max(year_options))+1):
+        yield 'time_spent', (year,), partial(time_spent_figure, cube, year)
+
+def time_spent_figure(cube, year):
     
-    # Convert the percentages to radians
-    year_df['graph_radians'] = [radians(year_df['time_percentage'][activity]*360) for activity in year_df.index]
+    with stage('aggregate'):
+        # Select the data respective to that year, group it by type and sum it, sorted by the value of the
+        # time in h, with the number of activities and the percentage of time spent in each activity
+        year_df = time_share(cube, year).rename(columns={'count': 'counter'})
     
-    # Create a column for the labels of the percentage of time
-    year_df['label_percentage'] = year_df['time_percentage']*100
+    with stage('labels'):
+        # Create a column for the labels of the time and for the colors of the sectors (red is running,
+        # green is walking and blue is cycling)
+        year_df['time_spent'] = format_duration(year_df.Time_h)
+        
+        activity_of_row = year_df.index.astype(str)
+        year_df['sector_color'] = np.select([activity_of_row == 'Running', activity_of_row == 'Walking'],
+                                            ['red', 'green'], 'blue')
+    
+    with stage('aggregate'):
+        # Convert the percentages to radians
+        year_df['graph_radians'] = [radians(year_df['time_percentage'][activity]*360)
+                                    for activity in year_df.index]
+        
+        # Create a column for the labels of the percentage of time
+        year_df['label_percentage'] = year_df['time_percentage']*100
     
     # =============================================================================
     # Plotting
     # =============================================================================
     
-    # Set the source of the data
-    source = ColumnDataSource(year_df)
-    
-    # Show the total amount of time spent
-    summed = year_df.sum()['Time_h'] # Total amount of time in hours
-    all_hours = int(summed)
-    all_minutes = int((summed-all_hours)*60) # Same procedure as above
-    
-    all_time = None
-    if len(str(all_minutes)) == 1 and all_minutes != 0:
-        all_minutes = '0'+str(all_minutes)
-            
-        # When the number of minutes is 0, the label is just the hours
-    elif all_minutes == 0:
-        all_time = str(hours) 
-        
-    if type(all_time) != str: # If all_time is already defined, this step will not be taken
-        all_time = str(all_hours)+':'+str(all_minutes)+'\'' # Create the label
+    with stage('figure'):
+        # Set the source of the data
+        source = ColumnDataSource(year_df)
     
+        # Show the total amount of time spent
+        summed = year_df['Time_h'].sum() # Total amount of time in hours
+        all_time = format_duration(summed)
     
-    # Define the title
-    title = 'Time Spent in Exercising Activities in '+str(year)+' - '+all_time
+        # Define the title
+        title = 'Time Spent in Exercising Activities in '+str(year)+' - '+all_time
     
-    # Set the tooltips
-    tooltips = [('Distance', "@Distance_km{0,0.00} km"), ('Time', "@time_spent"),
-                ('Percentage of Time Spent', "@label_percentage{0.00}%"),
-                ("Calories burned","@Calories{0,0}"),
-                ("Cumulative Elevation Gain", "@ElevGain_m{0,0} m"), 
-                ('Number of activities', "@counter")]
+        # Set the tooltips
+        tooltips = [('Distance', "@Distance_km{0,0.00} km"), ('Time', "@time_spent"),
+                    ('Percentage of Time Spent', "@label_percentage{0.00}%"),
+                    ("Calories burned","@Calories{0,0}"),
+                    ("Cumulative Elevation Gain", "@ElevGain_m{0,0} m"), 
+                    ('Number of activities', "@counter")]
     
-    # Instantiate the figure
-    time_pie = figure(plot_height=500, title=title, tools='hover, save', tooltips=tooltips,
-                      x_range=(-0.65, 1.2), sizing_mode='scale_both')
+        # Instantiate the figure
+        time_pie = figure(plot_height=500, title=title, tools='hover, save', tooltips=tooltips,
+                          x_range=(-0.65, 1.2), sizing_mode='scale_both')
     
-    # Add the sectors
-    time_pie.wedge(x=0, y=0, radius=0.6, start_angle=cumsum('graph_radians', include_zero=True),
-                   end_angle=cumsum('graph_radians'), line_color='black', fill_color='sector_color',
-                   legend_field='Type', source=source)
+        # Add the sectors
+        time_pie.wedge(x=0, y=0, radius=0.6, start_angle=cumsum('graph_radians', include_zero=True),
+                       end_angle=cumsum('graph_radians'), line_color='black', fill_color='sector_color',
+                       legend_field='Type', source=source)
     
-    # Tweak the title
-    time_pie.title.align = 'center'
-    time_pie.title.text_font_size = "20px"    
+        # Tweak the title
+        time_pie.title.align = 'center'
+        time_pie.title.text_font_size = "20px"    
 
-    # Hide the axes
-    time_pie.axis.visible = False
+        # Hide the axes
+        time_pie.axis.visible = False
 
-    # Remove the gridlines
-    time_pie.xgrid.grid_line_color, time_pie.ygrid.grid_line_color = None, None
+        # Remove the gridlines
+        time_pie.xgrid.grid_line_color, time_pie.ygrid.grid_line_color = None, None
 
-    # Remove the outline
-    time_pie.outline_line_color = None
+        # Remove the outline
+        time_pie.outline_line_color = None
     
-    time_pie.legend.location = "center_right"
+        time_pie.legend.location = "center_right"
     
-    # Show the figure
-    st.bokeh_chart(time_pie, True)
\ No newline at end of file
+    return time_pie
\ No newline at end of file
@@ -0,0 +1,192 @@
+"""Background warm-up of the figure cache.
+
+After a deploy or a change of the data, the first session to open each view would build its figure.
+When the SPORTS_WARMUP environment variable is "1", the dashboard starts a background thread which goes
+through the selector space of every page (the <function>_views generators of the pages, see
+page_registry) and builds the figures which are not cached yet, for the current version of the data:
+    SPORTS_WARMUP=1 streamlit run sports_visualization.py
+
+The figures are built by a small thread pool (SPORTS_WARMUP_WORKERS threads, 1 by default) whose
+threads run at the lowest priority of the system, with a pause between figures so the sessions get the
+interpreter first. The pages are visited in turns, so the first views of every page are warm soonest.
+When the version of the data changes, the views left for the old version are dropped and the warm-up
+starts over for the new one. It also stops before the figures it adds would evict the ones of the
+sessions from the cache.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from activity_cube import data_version, load_cube
+from data_loader import DATA_PATH
+from figure_cache import cache_figure, figure_cache
+from page_registry import PAGES
+
+logger = logging.getLogger('sports.warmup')
+
+WARMUP = os.environ.get('SPORTS_WARMUP', '0') == '1'
+
+WORKERS = int(os.environ.get('SPORTS_WARMUP_WORKERS', 1))
+
+# Nice value of the threads of the warm-up, the lowest priority
+NICENESS = 19
+
+# Seconds between two figures of a thread, and between two checks for a new version of the data once
+# every view is warm
+PAUSE = 0.01
+CHECK_INTERVAL = 5
+
+# Share of the figure cache the warm-up can fill
+MAX_CACHE_SHARE = 0.8
+
+# =============================================================================
+
+def lower_priority():
+
+    # On Linux the priority of a thread is set through its id, elsewhere this fails and the thread
+    # keeps the priority of the process
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+# =============================================================================
+
+def page_views(cube, pages=PAGES):
+
+    # The views generator of every page which has one
+    import importlib
+
+    generators = []
+    for title, reference in pages:
+        module_name, func_name = reference.split(':')
+        views = getattr(importlib.import_module(module_name), func_name+'_views', None)
+        if views is not None:
+            generators.append(views(cube))
+
+    return generators
+
+# =============================================================================
+
+def interleave(generators):
+
+    # One item of each generator in turn, until they are all exhausted
+    generators = list(generators)
+    while generators:
+        for generator in list(generators):
+            try:
+                yield next(generator)
+            except StopIteration:
+                generators.remove(generator)
+
+# =============================================================================
+
+class WarmUp:
+    """Thread which keeps the figure cache warm for the current version of the data.
+    """
+    def __init__(self, pages=PAGES, workers=WORKERS, path=DATA_PATH):
+        self.pages = pages
+        self.path = path
+        self.version = None
+        self.built = 0
+        self.failed = 0
+
+        self.stopped = threading.Event()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='warmup', initializer=lower_priority)
+
+        # Bounds the figures waiting for a thread, so the views of an old version are not queued
+        self.slots = threading.BoundedSemaphore(workers)
+
+        self.thread = threading.Thread(target=self.run, name='warmup-scheduler', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
+
+    def is_current(self, version):
+        # Loading the cube also picks up the changes of the data, as a session would
+        if self.stopped.is_set():
+            return False
+
+        load_cube(self.path)
+        return data_version(self.path) == version
+
+    def cache_full(self):
+        return figure_cache.size >= MAX_CACHE_SHARE*figure_cache.max_bytes
+
+    def build(self, page, selectors, build, version):
+        try:
+            if self.is_current(version) and not self.cache_full():
+                if cache_figure(page, selectors, build, version):
+                    self.built += 1
+        except Exception:
+            self.failed += 1
+            logger.warning('Warm-up of %s %s failed', page, selectors, exc_info=True)
+        finally:
+            self.slots.release()
+            time.sleep(PAUSE)
+
+    def warm(self, cube, version):
+        """Builds the missing figures of version, returns early when the version changes.
+        """
+        start = time.perf_counter()
+        for page, selectors, build in interleave(page_views(cube, self.pages)):
+            self.slots.acquire()
+            if not self.is_current(version):
+                self.slots.release()
+                return
+
+            if self.cache_full():
+                self.slots.release()
+                logger.info('Warm-up of version %s stopped, the figure cache is full', version)
+                return
+
+            self.executor.submit(self.build, page, selectors, build, version)
+
+        logger.info('Warm-up of version %s done in %.1f s', version, time.perf_counter()-start)
+
+    def run(self):
+        lower_priority()
+
+        while not self.stopped.is_set():
+            try:
+                cube = load_cube(self.path)
+                version = data_version(self.path)
+
+                if version != self.version:
+                    self.version = version
+                    self.warm(cube, version)
+
+                    # Start over at once for a new version
+                    if data_version(self.path) != version:
+                        continue
+            except Exception:
+                logger.warning('Warm-up failed', exc_info=True)
+
+            self.stopped.wait(CHECK_INTERVAL)
+
+# =============================================================================
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+def start_warmup(force=False):
+    """Starts the warm-up of the process, once, when SPORTS_WARMUP is "1" (or force is set). Returns
+    it, or None when it is off.
+    """
+    global _warmup
+
+    if not (WARMUP or force):
+        return None
+
+    with _warmup_lock:
+        if _warmup is None:
+            _warmup = WarmUp().start()
+
+    return _warmup
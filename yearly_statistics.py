@@ -1,9 +1,17 @@
 import streamlit as st
 
+from functools import partial
+
 import numpy as np
 import pandas as pd
 
+from activity_cube import activities
+from client_side import STATISTICS, client_side_mode, switchable_figure
+from date_range import page_cube
+from figure_cache import show_figure
 from general_functions import create_color_time_spent_columns, title_label_plot
+from instrumentation import stage, trace_selectors
+from queries import yearly_stats
 
 from bokeh.models import ColumnDataSource, LabelSet
 from bokeh.plotting import figure
@@ -13,43 +21,66 @@ def yearly_statistics():
     # Page title
     st.markdown("<h1 style='text-align: center;'>Yearly Statistics</h1>", unsafe_allow_html=True)
     
-    # Load the dataframe
-    df = pd.read_csv('rwc.csv', index_col=0, parse_dates=['Date'])
+    # Load the aggregates of the activities of the dates chosen in the sidebar
+    with stage('load'):
+        cube, date_range = page_cube()
+    
+    if cube is None:
+        return
+    
+    # The activity and the statistic can also be switched in the browser, between the figures of all
+    # of them, which are small
+    if client_side_mode():
+        activity_options = activities(cube)
+        trace_selectors(activity=None, statistic=None)
+        
+        show_figure('yearly_statistics', (None, None), lambda: switchable_figure(
+            {(activity, statistic): yearly_statistics_figure(cube, activity, statistic)
+             for activity in activity_options for statistic in STATISTICS},
+            [('Activity:', activity_options), ('Statistic:', STATISTICS)]), date_range=date_range)
+        return
     
     # Variables to select the activity and the statistic
     
     col_1, col_2 = st.columns(2)
-    activity = col_1.selectbox('Activity:', sorted(df.Type.unique()))
-    statistic = col_2.selectbox('Statistic:', ('Count', 'Distance', 'Time'))
+    activity = col_1.selectbox('Activity:', activities(cube))
+    statistic = col_2.selectbox('Statistic:', STATISTICS)
+    trace_selectors(activity=activity, statistic=statistic)
+    
+    # Show the figure, which is only built when it is not cached
+    show_figure('yearly_statistics', (activity, statistic),
+                lambda: yearly_statistics_figure(cube, activity, statistic), date_range=date_range)
+
+def yearly_statistics_views(cube):
+    
+    # Every activity and statistic
+    for activity in activities(cube):
+        for statistic in STATISTICS:
+            yield ('yearly_statistics', (activity, statistic),
+                   partial(yearly_statistics_figure, cube, activity, statistic))
+
+def yearly_statistics_figure(cube, activity, statistic):
     
     #####################################################################################################
     # Data selection and curation
     #####################################################################################################
     
-    # Limit the data you will consider based on the activity, group it by year and sum it
-    activity_df = df.loc[df.Type==activity].groupby('Year').sum()
-    
-    # Round the decimal cases of the distance to 2 if the activity is not cycling, and to 0 if it is cycling
-    if activity != 'Cycling':
-        activity_df.Distance_km = activity_df.Distance_km.round(2)
-    else:
-        activity_df.Distance_km = activity_df.Distance_km.round(0)
-    
-    # Add the average speed column which needs to come from the grouped data by years but the mean is taken
-    # instead of the sum. In this case, regardless of the activity, the number is rounded to 2 decimal cases
-    activity_df['avg_speed'] = df.loc[df.Type==activity].groupby('Year').mean()['AvgSpeed_km/h'].round(2)
-    
-    # Add the counts column which comes from the grouped data by years and a counter is taken
-    activity_df['count'] = df.loc[df.Type==activity].groupby('Year').count()['Date']
+    with stage('aggregate'):
+        # Limit the data you will consider based on the activity, group it by year and sum it, with the
+        # average speed and the number of activities per year
+        activity_df = yearly_stats(cube, activity)
     
     # Create the color and the time label columns
-    create_color_time_spent_columns(activity_df, statistic)
+    with stage('labels'):
+        create_color_time_spent_columns(activity_df, statistic)
     
     #####################################################################################################
     # Plotting
     #####################################################################################################
     
-    sports_fig, height_choice, label_choice, source = title_label_plot('yearly', activity, statistic, activity_df)
+    with stage('figure'):
+        sports_fig, height_choice, label_choice, source = title_label_plot('yearly', activity, statistic,
+                                                                           activity_df)
     
     # height_choice
 
@@ -60,5 +91,4 @@ def yearly_statistics():
     # Add the labels to the figure
     # sports_fig.add_layout(labels)
 
-    # Show the figure
-    st.bokeh_chart(sports_fig, True)
\ No newline at end of file
+    return sports_fig